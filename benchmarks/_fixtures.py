@@ -0,0 +1,115 @@
+""" Helpers for setting up the throwaway cpu installations and contests that benchmarks run in. """
+
+import contextlib, json, os, platform, shutil, statistics, subprocess, sys, tempfile, time
+
+# Runs cpu's main with the command line given after it
+CPU_MAIN = "from compprogutils import cpu; cpu.main()"
+
+CONFIG = {
+    "commands" : {
+        "py" : {"compile" : {"__default__" : [["cp", "{file}", "{name}.py"], ["{name}.py"]]},
+                "run" : [sys.executable, "{file}"]},
+        "c" : {"compile" : {"__default__" : [["gcc", "-O2", "{file}", "-o", "{name}"], ["{name}"]]},
+               "run" : ["{file}"]},
+    },
+    "display_io_side_by_side" : False,
+}
+
+DEFAULT_MANIFEST = {"solutions" : {}, "checkers" : {}, "generators" : {}, "tests" : {},
+                    "default_checker" : "tokens"}
+
+@contextlib.contextmanager
+def sandbox():
+    """ Context manager that creates a temporary home folder with a cpu configuration folder,
+    points HOME to it, and changes into it. The folder is deleted afterwards. Modules that read
+    the configuration folder must be imported inside the sandbox. """
+    home = tempfile.mkdtemp(prefix = "cpu-bench-")
+    confDirectory = os.path.join(home, ".cpu")
+    os.mkdir(confDirectory)
+    with open(os.path.join(confDirectory, "config.json"), "w") as f:
+        json.dump(CONFIG, f)
+    with open(os.path.join(confDirectory, "default_manifest.json"), "w") as f:
+        json.dump(DEFAULT_MANIFEST, f)
+    with open(os.path.join(confDirectory, "global_manifest.json"), "w") as f:
+        json.dump({"checkers" : {"tokens" : {"_custom_type" : "TokenChecker", "name" : "tokens",
+                                             "src" : "<builtin>", "exec_loc" : None, "precompiled" : True}}}, f)
+    previousHome, previousDir = os.environ.get("HOME"), os.getcwd()
+    os.environ["HOME"] = home
+    os.chdir(home)
+    try:
+        yield home
+    finally:
+        os.chdir(previousDir)
+        if previousHome is None:
+            del os.environ["HOME"]
+        else:
+            os.environ["HOME"] = previousHome
+        shutil.rmtree(home, ignore_errors = True)
+
+def runCPU(*args, stdin = None, extraFlags = ()):
+    """ Run cpu as a separate process with the given arguments, and return the CompletedProcess. """
+    return subprocess.run([sys.executable, *extraFlags, "-c", CPU_MAIN, *args], input = stdin,
+                          stdout = subprocess.PIPE, stderr = subprocess.PIPE, text = True, check = True)
+
+def makeProblem(solutions = {}, generators = {}):
+    """ Create a contest with a single problem in the current folder, change into the problem folder,
+    and add and compile the solutions in the dict solutions, which maps file names to source code.
+    The generators in the dict generators are added the same way. """
+    runCPU("make-contest", "1")
+    os.chdir("A")
+    for fileName, source in solutions.items():
+        with open(fileName, "w") as f:
+            f.write(source)
+        runCPU("add-solution", fileName)
+        runCPU("compile-solution", os.path.splitext(fileName)[0])
+    for fileName, source in generators.items():
+        with open(fileName, "w") as f:
+            f.write(source)
+        runCPU("add-generator", fileName)
+
+def addTests(inputs, solName = None):
+    """ Add a test to the problem in the current folder for each string in inputs. If solName is
+    given, generate the outputs of the new tests with that solution. """
+    inputDirectory = tempfile.mkdtemp(prefix = "cpu-bench-tests-")
+    try:
+        for index, testInput in enumerate(inputs):
+            with open(os.path.join(inputDirectory, f"{index}.in"), "w") as f:
+                f.write(testInput)
+        runCPU("import-tests", inputDirectory)
+    finally:
+        shutil.rmtree(inputDirectory)
+    if solName is not None:
+        runCPU("make-output", solName)
+
+def timeRepeated(func, repeat, setup = None):
+    """ Call func repeat times, and return the wall time of each call in milliseconds. If setup
+    is given, it is called before each call, and is not timed. """
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        started = time.perf_counter()
+        func()
+        times.append((time.perf_counter() - started) * 1000)
+    return times
+
+def summarize(times):
+    """ Return the minimum and median of a list of times in milliseconds, as a dict. """
+    return {"min_ms" : min(times), "median_ms" : statistics.median(times)}
+
+def environment():
+    """ Return a dict describing where the benchmarks ran, so results from different
+    commits and machines can be told apart. """
+    commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd = os.path.dirname(os.path.abspath(__file__)),
+                            stdout = subprocess.PIPE, stderr = subprocess.DEVNULL, text = True).stdout.strip()
+    return {"commit" : commit or None, "python" : sys.version, "machine" : platform.machine(),
+            "cpus" : os.cpu_count()}
+
+def writeResults(results, outputFile):
+    """ Print results as JSON, along with the environment they were measured in, and also write
+    them to outputFile if it is given. """
+    text = json.dumps({"environment" : environment(), **results}, indent = 2)
+    print(text)
+    if outputFile is not None:
+        with open(outputFile, "w") as f:
+            f.write(text)
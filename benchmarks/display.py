@@ -0,0 +1,44 @@
+""" Benchmark for rendering the tables that show tests.
+
+Times Test.testDisplayTable on tests with small and large files, and with a single very long
+line, in both the stacked and side-by-side layouts. Previews of unchanged files are cached, so
+each case is timed cold, with the cache cleared before every call, and warm. Usage:
+
+    python benchmarks/display.py [--repeat N] [--output results.json]
+"""
+
+import argparse, json
+
+import _fixtures
+
+# Lines per test file
+TEST_SIZES = {"small" : 5, "large" : 200000}
+# Characters in the single line of the long line test
+LONG_LINE_LENGTH = 20000000
+
+def main():
+    argParser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    argParser.add_argument("--repeat", "-r", type = int, default = 20)
+    argParser.add_argument("--output", "-o", type = str)
+    args = argParser.parse_args()
+    results = {"layouts" : {}}
+    with _fixtures.sandbox():
+        _fixtures.makeProblem()
+        _fixtures.addTests(["".join(f"{line} {line * line}\n" for line in range(lineCount))
+                            for lineCount in TEST_SIZES.values()] + ["7" * LONG_LINE_LENGTH + "\n"])
+        # The configuration folder is only known inside the sandbox
+        from compprogutils import configuration, tests, utilities
+        for sideBySide in [False, True]:
+            with open(configuration.configFilePath("config.json"), "w") as f:
+                json.dump({**_fixtures.CONFIG, "display_io_side_by_side" : sideBySide}, f)
+            layoutResults = results["layouts"]["side_by_side" if sideBySide else "stacked"] = {}
+            for testID, sizeName in enumerate([*TEST_SIZES, "long_line"], start = 1):
+                test = tests.Test(str(testID))
+                render = lambda: test.testDisplayTable(maxLines = 5).table
+                cold = _fixtures.timeRepeated(render, args.repeat, setup = utilities._cachedPreview.cache_clear)
+                warm = _fixtures.timeRepeated(render, args.repeat)
+                layoutResults[sizeName] = {"cold" : _fixtures.summarize(cold), "warm" : _fixtures.summarize(warm)}
+    _fixtures.writeResults(results, args.output)
+
+if __name__ == "__main__":
+    main()
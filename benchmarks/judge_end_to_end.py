@@ -0,0 +1,36 @@
+""" Benchmark for judging a solution from the command line.
+
+Sets up a problem with trivial C and Python solutions that echo their input, and times
+`cpu test-solution` on each, as the user would run it. Usage:
+
+    python benchmarks/judge_end_to_end.py [--tests N] [--jobs J] [--repeat N] [--output results.json]
+"""
+
+import argparse
+
+import _fixtures
+
+SOLUTIONS = {
+    "echo_c.c" : "#include <stdio.h>\nint main() { int x; while (scanf(\"%d\", &x) == 1) printf(\"%d\\n\", x); }\n",
+    "echo_py.py" : "import sys\nsys.stdout.write(sys.stdin.read())\n",
+}
+
+def main():
+    argParser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    argParser.add_argument("--tests", "-n", type = int, default = 50)
+    argParser.add_argument("--jobs", "-j", type = int, default = 1)
+    argParser.add_argument("--repeat", "-r", type = int, default = 3)
+    argParser.add_argument("--output", "-o", type = str)
+    args = argParser.parse_args()
+    results = {"tests" : args.tests, "jobs" : args.jobs, "solutions" : {}}
+    with _fixtures.sandbox():
+        _fixtures.makeProblem(SOLUTIONS)
+        _fixtures.addTests([f"{index}\n" for index in range(args.tests)], solName = "echo_c")
+        for solName in ["echo_c", "echo_py"]:
+            times = _fixtures.timeRepeated(lambda: _fixtures.runCPU("test-solution", solName, "--jobs", str(args.jobs)),
+                                           args.repeat)
+            results["solutions"][solName] = {**_fixtures.summarize(times), "per_test_ms" : min(times) / args.tests}
+    _fixtures.writeResults(results, args.output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+""" Benchmark for loading and saving problem manifests of different sizes.
+
+For each size, times manifests.loadManifestType on a cold cache (the file is decoded) and on a
+warm cache (the file is unchanged), and manifests.saveManifestTo after a single test is added. Usage:
+
+    python benchmarks/manifest_io.py [--sizes 10 1000 100000] [--repeat N] [--output results.json]
+"""
+
+import argparse, os
+
+import _fixtures
+
+def benchmarkSize(manifests, tests, size, repeat):
+    """ Time loading and saving a problem manifest with size tests. """
+    with open(".cpu.problem_manifest.json", "w") as f:
+        f.write("{}")
+    with manifests.modifyManifest("problem") as m:
+        m.update({"solutions" : {}, "checkers" : {}, "generators" : {}, "default_checker" : "tokens"})
+        m["tests"] = {str(ID): tests.Test(str(ID)) for ID in range(1, size + 1)}
+    def loadCold():
+        manifests._manifestCache.clear()
+        manifests._mergedCache.clear()
+        manifests.loadManifestType("problem")
+    m = manifests.loadManifestType("problem")
+    def saveChanged():
+        # A new test each time, so the manifest really is written
+        newID = str(len(m["tests"]) + 1)
+        m["tests"][newID] = tests.Test(newID)
+        manifests.saveManifestTo(m, ".cpu.problem_manifest.json")
+    return {"file_bytes" : os.path.getsize(".cpu.problem_manifest.json"),
+            "load_cold" : _fixtures.summarize(_fixtures.timeRepeated(loadCold, repeat)),
+            "load_warm" : _fixtures.summarize(_fixtures.timeRepeated(lambda: manifests.loadManifestType("problem"), repeat)),
+            "save" : _fixtures.summarize(_fixtures.timeRepeated(saveChanged, repeat))}
+
+def main():
+    argParser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    argParser.add_argument("--sizes", "-s", type = int, nargs = "+", default = [10, 1000, 100000])
+    argParser.add_argument("--repeat", "-r", type = int, default = 10)
+    argParser.add_argument("--output", "-o", type = str)
+    args = argParser.parse_args()
+    results = {"sizes" : {}}
+    with _fixtures.sandbox():
+        # The configuration folder is only known inside the sandbox
+        from compprogutils import manifests, tests
+        for size in args.sizes:
+            results["sizes"][str(size)] = benchmarkSize(manifests, tests, size, args.repeat)
+    _fixtures.writeResults(results, args.output)
+
+if __name__ == "__main__":
+    main()
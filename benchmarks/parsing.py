@@ -0,0 +1,59 @@
+""" Benchmark for reading tokens from test files.
+
+For each size, writes a file of that many megabytes of random integers, and times parsers.tokenize
+and a pass over FileParser.iterTokenBatches (which the token checker uses) on it. Usage:
+
+    python benchmarks/parsing.py [--sizes 1 100] [--repeat N] [--output results.json]
+"""
+
+import argparse, os, random, tempfile
+
+import _fixtures
+
+from compprogutils import parsers
+
+def writeTokenFile(fileName, megabytes):
+    """ Write about megabytes megabytes of random integers to fileName, ten to a line. """
+    generator = random.Random(megabytes)
+    line = lambda: " ".join(str(generator.randrange(10 ** 9)) for _ in range(10)) + "\n"
+    lines = [line() for _ in range(1000)]
+    with open(fileName, "w") as f:
+        written = 0
+        while written < megabytes * 1024 * 1024:
+            block = "".join(generator.sample(lines, len(lines)))
+            f.write(block)
+            written += len(block)
+
+def benchmarkSize(megabytes, repeat):
+    """ Time tokenizing a file of megabytes megabytes. """
+    fd, fileName = tempfile.mkstemp(prefix = "cpu-bench-", suffix = ".txt")
+    os.close(fd)
+    try:
+        writeTokenFile(fileName, megabytes)
+        def tokenize():
+            with open(fileName, "rb") as f:
+                parsers.tokenize(f)
+        def iterateBatches():
+            with open(fileName, "rb") as f:
+                for _ in parsers.FileParser(f).iterTokenBatches():
+                    pass
+        results = {"tokenize" : _fixtures.summarize(_fixtures.timeRepeated(tokenize, repeat)),
+                   "iter_token_batches" : _fixtures.summarize(_fixtures.timeRepeated(iterateBatches, repeat))}
+        fileMegabytes = os.path.getsize(fileName) / (1024 * 1024)
+        for timing in results.values():
+            timing["mb_per_s"] = fileMegabytes / (timing["min_ms"] / 1000)
+        return results
+    finally:
+        os.remove(fileName)
+
+def main():
+    argParser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    argParser.add_argument("--sizes", "-s", type = int, nargs = "+", default = [1, 100])
+    argParser.add_argument("--repeat", "-r", type = int, default = 3)
+    argParser.add_argument("--output", "-o", type = str)
+    args = argParser.parse_args()
+    results = {"sizes_mb" : {str(megabytes): benchmarkSize(megabytes, args.repeat) for megabytes in args.sizes}}
+    _fixtures.writeResults(results, args.output)
+
+if __name__ == "__main__":
+    main()
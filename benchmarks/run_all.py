@@ -0,0 +1,36 @@
+""" Run every benchmark with its default settings, and collect the results in one JSON file.
+
+Each benchmark runs as a separate process, so that none of them starts with modules or caches
+another one loaded. Compare the files written for two commits to find regressions. Usage:
+
+    python benchmarks/run_all.py [--only NAME ...] [--output results.json]
+"""
+
+import argparse, json, os, subprocess, sys, tempfile
+
+import _fixtures
+
+BENCHMARKS = ["startup", "manifest_io", "parsing", "spawn", "judge_end_to_end", "stress_rounds", "display"]
+
+def main():
+    argParser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    argParser.add_argument("--only", type = str, nargs = "+", choices = BENCHMARKS, default = BENCHMARKS)
+    argParser.add_argument("--output", "-o", type = str)
+    args = argParser.parse_args()
+    results = {"benchmarks" : {}}
+    benchmarkDirectory = os.path.dirname(os.path.abspath(__file__))
+    with tempfile.TemporaryDirectory(prefix = "cpu-bench-results-") as resultDirectory:
+        for name in args.only:
+            print(f"Running {name}...", file = sys.stderr)
+            resultFile = os.path.join(resultDirectory, f"{name}.json")
+            subprocess.run([sys.executable, os.path.join(benchmarkDirectory, f"{name}.py"), "--output", resultFile],
+                           stdout = subprocess.DEVNULL, check = True)
+            with open(resultFile) as f:
+                benchmarkResults = json.load(f)
+            # The environment is recorded once, for the whole run
+            del benchmarkResults["environment"]
+            results["benchmarks"][name] = benchmarkResults
+    _fixtures.writeResults(results, args.output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+""" Benchmark for the overhead of running a program through Executable.run.
+
+Compiles a C program and a Python program that exit immediately, and times Executable.run on each
+against a bare subprocess.run of the same command. The difference is what cpu adds to every run. Usage:
+
+    python benchmarks/spawn.py [--repeat N] [--output results.json]
+"""
+
+import argparse, os, subprocess
+
+import _fixtures
+
+PROGRAMS = {
+    "empty.c" : "int main() { return 0; }\n",
+    "empty.py" : "",
+}
+
+def main():
+    argParser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    argParser.add_argument("--repeat", "-r", type = int, default = 50)
+    argParser.add_argument("--output", "-o", type = str)
+    args = argParser.parse_args()
+    results = {"programs" : {}}
+    with _fixtures.sandbox():
+        # The configuration folder is only known inside the sandbox
+        from compprogutils import executables
+        os.mkdir("bin")
+        for fileName, source in PROGRAMS.items():
+            with open(fileName, "w") as f:
+                f.write(source)
+            executable = executables.Executable(fileName.split(".")[0], fileName)
+            executable.compile(outputDirectory = "bin")
+            # Run once, so the run command is expanded and cached as in any later run
+            executable.run()
+            command = [part.format(file = os.path.abspath(executable.exec_loc)) for part in executable.getRunCommand()]
+            bare = _fixtures.timeRepeated(lambda: subprocess.run(command, stdout = subprocess.PIPE), args.repeat)
+            throughCPU = _fixtures.timeRepeated(executable.run, args.repeat)
+            results["programs"][fileName] = {"subprocess_run" : _fixtures.summarize(bare),
+                                             "executable_run" : _fixtures.summarize(throughCPU),
+                                             "overhead_ms" : min(throughCPU) - min(bare)}
+    _fixtures.writeResults(results, args.output)
+
+if __name__ == "__main__":
+    main()
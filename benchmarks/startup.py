@@ -0,0 +1,49 @@
+""" Benchmark for the startup time of the cpu command line.
+
+Runs a few commands many times each and reports their wall times, along with the slowest
+imports reported by `python -X importtime`. Usage:
+
+    python benchmarks/startup.py [--repeat N] [--output results.json]
+"""
+
+import argparse, re, subprocess, sys
+
+import _fixtures
+
+COMMANDS = {
+    "list-tests" : ["list-tests", "-s", "1"],
+    "run-solution" : ["run-solution", "sol", "-i", "1", "-s"],
+}
+
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+def slowestImports(args, count = 15):
+    """ Run cpu with args under -X importtime, and return the count top-level imports with the
+    largest cumulative time, as (module, microseconds) pairs. """
+    stderr = _fixtures.runCPU(*args, extraFlags = ["-X", "importtime"]).stderr
+    topLevel = []
+    for line in stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match is not None and len(match.group(3)) == 1:
+            topLevel.append((match.group(4), int(match.group(2))))
+    return sorted(topLevel, key = lambda entry: -entry[1])[:count]
+
+def main():
+    argParser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    argParser.add_argument("--repeat", "-r", type = int, default = 20)
+    argParser.add_argument("--output", "-o", type = str)
+    args = argParser.parse_args()
+    results = {"commands" : {}}
+    with _fixtures.sandbox():
+        _fixtures.makeProblem({"sol.py" : "print(input())\n"})
+        _fixtures.runCPU("add-test", stdin = "1\n\n")
+        # The interpreter's own startup time is the floor for every command
+        results["interpreter"] = _fixtures.summarize(_fixtures.timeRepeated(
+            lambda: subprocess.run([sys.executable, "-c", "pass"], check = True), args.repeat))
+        for name, commandArgs in COMMANDS.items():
+            times = _fixtures.timeRepeated(lambda: _fixtures.runCPU(*commandArgs), args.repeat)
+            results["commands"][name] = {**_fixtures.summarize(times), "slowest_imports_us" : slowestImports(commandArgs)}
+    _fixtures.writeResults(results, args.output)
+
+if __name__ == "__main__":
+    main()
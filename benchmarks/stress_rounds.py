@@ -0,0 +1,39 @@
+""" Benchmark for the speed of stress testing.
+
+Sets up a problem whose two solutions always agree, so that `cpu stress-test` never stops early,
+and reports the number of rounds it runs per second. Usage:
+
+    python benchmarks/stress_rounds.py [--rounds N] [--jobs J] [--output results.json]
+"""
+
+import argparse, time
+
+import _fixtures
+
+SOLUTIONS = {
+    "fast.c" : "#include <stdio.h>\nint main() { int x; scanf(\"%d\", &x); printf(\"%d\\n\", 2 * x); }\n",
+    "brute.c" : "#include <stdio.h>\nint main() { int x; scanf(\"%d\", &x); printf(\"%d\\n\", x + x); }\n",
+}
+
+GENERATORS = {
+    "gen.c" : "#include <stdio.h>\n#include <stdlib.h>\nint main(int argc, char **argv) {\n"
+              "    srand(argc > 1 ? atoi(argv[1]) : 1); printf(\"%d\\n\", rand() % 1000);\n}\n",
+}
+
+def main():
+    argParser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    argParser.add_argument("--rounds", "-n", type = int, default = 200)
+    argParser.add_argument("--jobs", "-j", type = int, default = 1)
+    argParser.add_argument("--output", "-o", type = str)
+    args = argParser.parse_args()
+    with _fixtures.sandbox():
+        _fixtures.makeProblem(SOLUTIONS, GENERATORS)
+        started = time.perf_counter()
+        _fixtures.runCPU("stress-test", "fast", "brute", "gen", "--rounds", str(args.rounds),
+                         "--jobs", str(args.jobs), "--seed-from", "1")
+        elapsed = time.perf_counter() - started
+    results = {"rounds" : args.rounds, "jobs" : args.jobs, "total_s" : elapsed, "rounds_per_s" : args.rounds / elapsed}
+    _fixtures.writeResults(results, args.output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+""" Module for the content-addressed store that test files can be kept in.
+
+A stored file is kept once in the blobs folder of the configuration folder, named by the SHA-256 hash
+of its contents. Test files in the store are hard links to their blob, so identical files, in the same
+problem or in different ones, take up space only once. A blob may be compressed, in which case the test
+file that links to it has the compression's suffix added (e.g. tests/3.in.gz); such files are
+decompressed as they are read.
+
+Only files on the filesystem of the store can be stored, as hard links cannot cross filesystems.
+Since a blob is shared, a stored file must never be written in place. Test.getFileObject breaks the
+link before writing, and other writers replace test files instead of writing into them. Blobs are
+read-only, to catch writers that do not. """
+
+import gzip, hashlib, os, shutil, tempfile
+
+from compprogutils import configuration, cpu_errors
+
+# zstd compression is optional, and needs the zstandard package
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+BLOB_DIRECTORY = configuration.configFilePath("blobs")
+CHUNK_SIZE = 1 << 20
+
+def _openZstd(fileName, mode = "rb", **kwargs):
+    """ Like open, but compresses and decompresses with zstd. """
+    if zstandard is None:
+        raise cpu_errors.MissingDependency("""Reading and writing zstd compressed tests needs the zstandard package.
+Install it with pip install zstandard.""")
+    return zstandard.open(fileName, mode, **kwargs)
+
+# Compressed file suffix, and a function like open for the format
+COMPRESSIONS = {"gzip" : (".gz", gzip.open), "zstd" : (".zst", _openZstd)}
+
+def compressionOf(fileName):
+    """ Return the name of the compression of the file with the given name, judging by its suffix,
+    or None if it is not compressed. """
+    for compression, (suffix, _) in COMPRESSIONS.items():
+        if fileName.endswith(suffix):
+            return compression
+    return None
+
+def storedVariants(fileName):
+    """ Return the names the file with the given name may be stored under: as is, or compressed. """
+    return [fileName] + [fileName + suffix for suffix, _ in COMPRESSIONS.values()]
+
+def openStored(fileName, mode = "r", **kwargs):
+    """ Like open, but files with a compression suffix are transparently decompressed. Text modes
+    read the decompressed contents as text. """
+    compression = compressionOf(fileName)
+    if compression is None:
+        return open(fileName, mode, **kwargs)
+    if "b" not in mode and "t" not in mode:
+        mode += "t"
+    return COMPRESSIONS[compression][1](fileName, mode, **kwargs)
+
+def fileDigest(fileName):
+    """ Return the SHA-256 hash of the decompressed contents of the file with the given name. """
+    hasher = hashlib.sha256()
+    with openStored(fileName, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+def blobPath(digest, compression = None):
+    """ Return the file name of the blob with the given hash and compression. """
+    suffix = "" if compression is None else COMPRESSIONS[compression][0]
+    return os.path.join(BLOB_DIRECTORY, digest[:2], digest + suffix)
+
+def canStore(fileName):
+    """ Return True iff the file with the given name is on the filesystem of the store, so it can be
+    linked to a blob. The store is made if it does not exist. """
+    os.makedirs(BLOB_DIRECTORY, exist_ok = True)
+    return os.stat(fileName).st_dev == os.stat(BLOB_DIRECTORY).st_dev
+
+def storeFile(fileName, compression = None):
+    """ Move the file with the given name (which may be compressed) into the store, compressed with
+    compression (None for no compression). The file is replaced by a link to its blob, named fileName
+    with the compression's suffix in place of any old one. Return the name of the stored file.
+    Raise CrossDeviceStore if the file cannot be stored (see canStore). """
+    if not canStore(fileName):
+        raise cpu_errors.CrossDeviceStore(f"""{fileName} is on another filesystem than the blob store
+in {BLOB_DIRECTORY}, so it cannot be linked to it.""")
+    currentCompression = compressionOf(fileName)
+    plainName = fileName[:len(fileName) - len(COMPRESSIONS[currentCompression][0])] if currentCompression else fileName
+    storedName = plainName + ("" if compression is None else COMPRESSIONS[compression][0])
+    digest = fileDigest(fileName)
+    blobName = blobPath(digest, compression)
+    if not os.path.isfile(blobName):
+        os.makedirs(os.path.dirname(blobName), exist_ok = True)
+        # Write to a temporary name first, so the store never has a partial blob
+        fd, tempName = tempfile.mkstemp(dir = os.path.dirname(blobName), prefix = ".tmp")
+        os.close(fd)
+        try:
+            with openStored(fileName, "rb") as source:
+                with (open(tempName, "wb") if compression is None else COMPRESSIONS[compression][1](tempName, "wb")) as blob:
+                    shutil.copyfileobj(source, blob, CHUNK_SIZE)
+            os.chmod(tempName, 0o444)
+            os.replace(tempName, blobName)
+        except BaseException:
+            os.remove(tempName)
+            raise
+    # Link under a temporary name, then replace, so the test file always exists
+    tempName = f"{storedName}.tmp"
+    os.link(blobName, tempName)
+    os.replace(tempName, storedName)
+    if storedName != fileName:
+        os.remove(fileName)
+    return storedName
+
+def unshareFile(fileName):
+    """ Make sure the file with the given name is not linked to a blob or another file, by replacing
+    it with a copy, so it can be written in place. """
+    if os.path.isfile(fileName) and os.stat(fileName).st_nlink > 1:
+        tempName = f"{fileName}.tmp"
+        shutil.copyfile(fileName, tempName)
+        os.replace(tempName, fileName)
+
+def diskUsage(fileNames):
+    """ Return the number of bytes the files with the given names take up, counting files that are
+    links to each other once. Files that do not exist are skipped. """
+    sizes = {}
+    for fileName in fileNames:
+        try:
+            fileStat = os.stat(fileName)
+        except FileNotFoundError:
+            continue
+        sizes[(fileStat.st_dev, fileStat.st_ino)] = fileStat.st_size
+    return sum(sizes.values())
+
+def collectGarbage():
+    """ Delete the blobs no test file links to anymore. Return the number of bytes freed. """
+    freed = 0
+    if not os.path.isdir(BLOB_DIRECTORY):
+        return freed
+    for directory, _, fileNames in os.walk(BLOB_DIRECTORY):
+        for fileName in fileNames:
+            blobName = os.path.join(directory, fileName)
+            blobStat = os.stat(blobName)
+            if blobStat.st_nlink == 1:
+                os.remove(blobName)
+                freed += blobStat.st_size
+    return freed
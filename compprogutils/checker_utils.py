@@ -1,7 +1,28 @@
 """ Module for checker utilities. This should contain all code users could use to streamline
 writing checkers, while checkers.py contains all code cpu needs to deal with checkers. """
 
-import sys, functools, os
+import sys, functools, os, json
+
+# A checker run with this argument is a checker server (see serveFromStreams)
+SERVE_FLAG = "--serve"
+# The first line a checker server prints, so cpu knows the checker understood SERVE_FLAG
+SERVER_GREETING = "cpu-checker-server 1"
+
+def _checkFiles(func, fileNames):
+    """ Call func with the files with the 4 given names opened for reading, or None for
+    files that do not exist, and return its result. """
+    argList = []
+    for fileName in fileNames:
+        if os.path.isfile(fileName):
+            argList.append(open(fileName, "r"))
+        else:
+            argList.append(None)
+    try:
+        return func(*argList)
+    finally:
+        for fileStream in argList:
+            if fileStream is not None:
+                fileStream.close()
 
 def checkFromStreams(func):
     """ Decorator for writing cpu checkers. Takes in a function that
@@ -9,16 +30,24 @@ def checkFromStreams(func):
     and converts it into a function that takes filenames from sys.argv. """
     @functools.wraps(func)
     def decorated():
-        argList = []
-        for i in range(4):
-            if os.path.isfile(sys.argv[i + 1]):
-                argList.append(open(sys.argv[i + 1], "r"))
-            else:
-                argList.append(None)
-        try:
-            print(*func(*argList), sep = "\n")
-        finally:
-            for fileStream in argList:
-                if fileStream is not None:
-                    fileStream.close()
+        print(*_checkFiles(func, sys.argv[1:5]), sep = "\n")
+    return decorated
+
+def serveFromStreams(func):
+    """ Like checkFromStreams, but the checker can also be run as a checker server, which checks
+    many outputs in one process instead of being started once per test. Use this for checkers
+    added with `cpu add-checker --persistent`.
+
+    When run with --serve, the checker prints SERVER_GREETING on a line, then reads requests from
+    stdin, one per line. A request is a JSON list of the 4 file names usually given in sys.argv.
+    For each, it prints a line with the JSON list [score, message]. It stops at the end of stdin. """
+    checkOnce = checkFromStreams(func)
+    @functools.wraps(func)
+    def decorated():
+        if sys.argv[1:] != [SERVE_FLAG]:
+            return checkOnce()
+        print(SERVER_GREETING, flush = True)
+        for request in sys.stdin:
+            score, message = _checkFiles(func, json.loads(request))
+            print(json.dumps([score, str(message)]), flush = True)
     return decorated
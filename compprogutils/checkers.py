@@ -2,24 +2,270 @@
 
 import os, sys
 
-import functools
+import functools, json, select, subprocess, threading, atexit, time
+from contextlib import ExitStack
 
-from compprogutils import executables, tests, parsers, cpu_errors
+from compprogutils import executables, tests, parsers, cpu_errors, tracing, checker_utils
+
+# How long a persistent checker may take to start and greet cpu, in seconds
+SERVER_START_TIMEOUT = 10
+# How long a persistent checker may take to check an output, in seconds. A server that takes longer is
+# stopped, and the checker is started once per test instead
+SERVER_CHECK_TIMEOUT = 60
 
 class Checker(executables.Executable):
-    """ A checker is an executable that validates test output. """
+    """ A checker is an executable that validates test output.
+
+    If persistent is set, the checker is run as a checker server (see checker_utils.serveFromStreams):
+    it is started once, and checks every output sent to it. If it cannot be started as one, or stops
+    answering, cpu falls back to starting it once per test. """
+    def __init__(self, name, src, precompiled = False, persistent = False):
+        super().__init__(name, src, precompiled)
+        self.persistent = persistent
+        self._serverState = _ServerState()
+
+    @tracing.traced("checkOutputFile", lambda self, test, outputFile: {"checker" : self.name, "test" : test.ID})
     def checkOutputFile(self, test, outputFile):
         """ Check the outputFile file against the given test. Return a (score, message) tuple. """
-        checkerArgv = [test.getFilename(tests.TestFile.INPUT), test.getFilename(tests.TestFile.OUTPUT), \
-                        test.getFilename(tests.TestFile.DATA), outputFile]
-        checkerOutput, checkerTime = self.run(cmdArgs = [os.path.abspath(fileName) for fileName in checkerArgv])
-        outputToParse = parsers.StringParser(checkerOutput)
+        with ExitStack() as stack:
+            # The checker reads the test files itself, so compressed files are decompressed first
+            checkerArgv = [stack.enter_context(test.localFilename(testFile))
+                           for testFile in [tests.TestFile.INPUT, tests.TestFile.OUTPUT, tests.TestFile.DATA]] + [outputFile]
+            fileNames = [os.path.abspath(fileName) for fileName in checkerArgv]
+            if self.persistent:
+                served = self._serverState.check(self, fileNames)
+                if served is not None:
+                    return served
+            checkerResult = self.run(cmdArgs = fileNames)
+        outputToParse = parsers.StringParser(checkerResult.output)
         score = outputToParse.readData(float)
         remarks = outputToParse.readData(str, charSet = [])
         return (score, remarks)
 
+    def stopServer(self):
+        """ Stop the checker server of this checker, if it is running. """
+        self._serverState.stop()
+
+    def __serialize__(self):
+        result = super().__serialize__()
+        if self.persistent:
+            result["persistent"] = True
+        return result
+
+    @classmethod
+    def __deserialize__(cls, obj):
+        result = super().__deserialize__(obj)
+        result.persistent = obj.get("persistent", False)
+        return result
+
+    def __getstate__(self):
+        # The server belongs to this process, so copies sent to worker processes start their own
+        state = self.__dict__.copy()
+        state["_serverState"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._serverState = _ServerState()
+
+    def __copy__(self):
+        # Copies in this process share the server
+        result = self.__class__.__new__(self.__class__)
+        result.__dict__.update(self.__dict__)
+        return result
+
+class _ServerState:
+    """ The checker server of a persistent checker. It is started on first use, and restarted if the
+    checker program changes. Checks are sent to it one at a time. """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.process = None
+        # Identifies the program the server runs: its command and the version of its file
+        self.identity = None
+        self.pid = None
+        # Output of the server that was read, but is not part of a whole line yet
+        self.pendingOutput = b""
+        # Set once the server failed, after which the checker is started once per test
+        self.failed = False
+
+    def check(self, checker, fileNames):
+        """ Check the files with the 4 given names on the server of checker, starting it if needed.
+        Return a (score, message) tuple, or None if the server could not check them. """
+        with self.lock:
+            if self.failed:
+                return None
+            try:
+                identity = self.programIdentity(checker)
+                if self.process is None or self.identity != identity or self.pid != os.getpid():
+                    self.stopLocked()
+                    self.start(checker, identity)
+                self.process.stdin.write(json.dumps(fileNames) + "\n")
+                self.process.stdin.flush()
+                score, message = json.loads(self.readLine(SERVER_CHECK_TIMEOUT))
+                return (float(score), message)
+            except (OSError, ValueError, TypeError, cpu_errors.CPUException):
+                # The server is gone, too slow, or answered nonsense, so it is not used again
+                self.stopLocked()
+                self.failed = True
+                return None
+
+    def programIdentity(self, checker):
+        """ Return a value that changes when the program checker runs changes. """
+        command = checker.getExpandedRunCommand()
+        try:
+            fileStat = os.stat(checker.exec_loc)
+        except OSError:
+            return (command, None)
+        return (command, fileStat.st_mtime_ns, fileStat.st_size)
+
+    def start(self, checker, identity):
+        """ Start the server of checker, and wait for its greeting. Raise ValueError if it does not greet,
+        and TimeoutError if it greets too late. """
+        self.process = subprocess.Popen(checker.getExpandedRunCommand() + [checker_utils.SERVE_FLAG],
+                                        stdin = subprocess.PIPE, stdout = subprocess.PIPE, text = True,
+                                        start_new_session = True)
+        self.identity, self.pid = identity, os.getpid()
+        self.pendingOutput = b""
+        _runningServers.add(self)
+        if self.readLine(SERVER_START_TIMEOUT) != checker_utils.SERVER_GREETING:
+            raise ValueError(f"Checker {checker.name} did not start as a checker server")
+
+    def readLine(self, timeout):
+        """ Read a line from the server, without its newline, waiting for it at most timeout seconds.
+        Return an empty string if the server closed its output first, and raise TimeoutError if it
+        took too long. """
+        deadline = time.monotonic() + timeout
+        fd = self.process.stdout.fileno()
+        while b"\n" not in self.pendingOutput:
+            ready, _, _ = select.select([fd], [], [], max(0, deadline - time.monotonic()))
+            if not ready:
+                raise TimeoutError(f"The checker server did not answer in {timeout} seconds")
+            chunk = os.read(fd, 1 << 16)
+            if not chunk:
+                return ""
+            self.pendingOutput += chunk
+        line, _, self.pendingOutput = self.pendingOutput.partition(b"\n")
+        return line.decode()
+
+    def stop(self):
+        """ Stop the server, if it is running. """
+        with self.lock:
+            self.stopLocked()
+
+    def stopLocked(self):
+        """ Like stop, for callers that hold the lock. """
+        process, self.process = self.process, None
+        _runningServers.discard(self)
+        # A server inherited from the parent process is the parent's to stop
+        if process is None or self.pid != os.getpid():
+            return
+        # The server exits at the end of its input; one that does not is killed
+        try:
+            process.stdin.close()
+        except OSError:
+            pass
+        try:
+            process.wait(timeout = 1)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+        process.stdout.close()
+
+# Servers to stop when cpu exits
+_runningServers = set()
+
+@atexit.register
+def stopServers():
+    """ Stop every running checker server. """
+    for serverState in list(_runningServers):
+        serverState.stop()
+
+BUILTIN_SOURCE = "<builtin>"
+
+class TokenChecker(Checker):
+    """ A checker that runs inside cpu instead of as a separate program. It compares the expected and
+    received outputs token by token, ignoring whitespace. If floatTolerance is given, tokens that are
+    both numbers match if they differ by at most floatTolerance, absolutely or relatively. """
+    def __init__(self, name, floatTolerance = None):
+        super().__init__(name, BUILTIN_SOURCE, precompiled = True)
+        self.floatTolerance = floatTolerance
+
+    def compile(self, commandKey = None, outputDirectory = ""):
+        """ Built-in checkers need no compilation. """
+
+    @tracing.traced("checkOutputFile", lambda self, test, outputFile: {"checker" : self.name, "test" : test.ID})
+    def checkOutputFile(self, test, outputFile):
+        """ Check the outputFile file against the given test. Return a (score, message) tuple. """
+        with test.getFileObject(tests.TestFile.OUTPUT, "rb") as expectedFile:
+            with open(outputFile, "rb") as receivedFile:
+                tokenCount, mismatch = compareTokenStreams(parsers.FileParser(expectedFile).iterTokenBatches(),
+                                                           parsers.FileParser(receivedFile).iterTokenBatches(),
+                                                           self.tokensMatch)
+        if mismatch is None:
+            return (1.0, f"Outputs match ({tokenCount} tokens)")
+        expected, received = (EOF_TOKEN if token is None else repr(token) for token in mismatch)
+        return (0.0, f"Token {tokenCount + 1} differs: expected {expected}, received {received}")
+
+    def tokensMatch(self, expected, received):
+        """ Return True iff the received token is accepted in place of the expected token. """
+        if expected == received:
+            return True
+        if not self.floatTolerance:
+            return False
+        try:
+            expectedValue, receivedValue = float(expected), float(received)
+        except ValueError:
+            return False
+        return abs(expectedValue - receivedValue) <= self.floatTolerance * max(1.0, abs(expectedValue))
+
+    def __serialize__(self):
+        result = super().__serialize__()
+        result["float_tolerance"] = self.floatTolerance
+        return result
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.name}, floatTolerance = {self.floatTolerance})"
+
+    @classmethod
+    def __deserialize__(cls, obj):
+        return cls(obj["name"], obj.get("float_tolerance"))
+
+EOF_TOKEN = "end of file"
+
+def compareTokenStreams(expectedBatches, receivedBatches, tokensMatch):
+    """ Compare two streams of tokens, given as iterators of token lists (see
+    parsers.StringParser.iterTokenBatches). tokensMatch(expected, received) decides if two tokens match.
+
+    Return a (tokenCount, mismatch) tuple. If the streams match, tokenCount is the number of tokens and
+    mismatch is None. Otherwise, tokenCount is the number of matching tokens before the first mismatch,
+    and mismatch is the (expected, received) pair of differing tokens, where a token is None if its
+    stream ended. """
+    expectedBuffer, receivedBuffer = [], []
+    tokenCount = 0
+    while True:
+        if not expectedBuffer:
+            expectedBuffer = next(expectedBatches, [])
+        if not receivedBuffer:
+            receivedBuffer = next(receivedBatches, [])
+        if not expectedBuffer or not receivedBuffer:
+            if not expectedBuffer and not receivedBuffer:
+                return tokenCount, None
+            return tokenCount, (expectedBuffer[0] if expectedBuffer else None,
+                                receivedBuffer[0] if receivedBuffer else None)
+        n = min(len(expectedBuffer), len(receivedBuffer))
+        # Compare whole slices first, which is fast when they are identical
+        if expectedBuffer[:n] != receivedBuffer[:n]:
+            for i in range(n):
+                if not tokensMatch(expectedBuffer[i], receivedBuffer[i]):
+                    return tokenCount + i, (expectedBuffer[i], receivedBuffer[i])
+        tokenCount += n
+        expectedBuffer, receivedBuffer = expectedBuffer[n:], receivedBuffer[n:]
+
 def getVerdictString(score):
-    scoreIndicator = f"[{score:.2f}]"
+    return f"{getVerdictName(score)} [{score:.2f}]"
+
+def getVerdictName(score):
+    """ Return the short name (AC, WA, ...) of the verdict with the given score. """
     scoreText = None
     if score < 0:
         scoreText = "ERR"
@@ -31,5 +277,5 @@ def getVerdictString(score):
         scoreText = "AC"
     else:
         scoreText = "UNK"
-    return f"{scoreText} {scoreIndicator}"
+    return scoreText
 
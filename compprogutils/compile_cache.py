@@ -0,0 +1,87 @@
+""" Module for caching compiled programs, so that unchanged sources are not recompiled.
+
+Cached programs are stored in the compile_cache folder of the configuration folder, named by a
+hash of everything that determines the compiler's output. The least recently used entries are
+evicted once the folder grows past the size set by the compile_cache_size config key (in bytes). """
+
+import hashlib, os, shutil, json, tempfile
+
+from compprogutils import configuration
+
+CACHE_DIRECTORY = configuration.configFilePath("compile_cache")
+DEFAULT_CACHE_SIZE = 512 * 1024 * 1024
+
+def cacheSize():
+    """ Return the maximum size of the cache in bytes. A size of 0 disables the cache. """
+    return configuration.getConfig().get("compile_cache_size", DEFAULT_CACHE_SIZE)
+
+def compilerIdentity(command):
+    """ Return a string identifying the program that runs the given (expanded) compile command.
+    The program is identified by its resolved path, size and modification time, so upgrading
+    the compiler invalidates the cache. """
+    compilerPath = shutil.which(command[0])
+    if compilerPath is None:
+        return command[0]
+    compilerStat = os.stat(compilerPath)
+    return f"{os.path.realpath(compilerPath)}:{compilerStat.st_size}:{compilerStat.st_mtime_ns}"
+
+def cacheKey(srcFile, command):
+    """ Return the cache key of compiling srcFile with the expanded compile command. The key
+    covers the contents of srcFile, but not files it includes. """
+    hasher = hashlib.sha256()
+    with open(srcFile, "rb") as src:
+        for chunk in iter(lambda: src.read(1 << 16), b""):
+            hasher.update(chunk)
+    hasher.update(json.dumps(command).encode("utf-8"))
+    hasher.update(compilerIdentity(command).encode("utf-8"))
+    return hasher.hexdigest()
+
+def fetch(key, destination):
+    """ Copy the cached program with the given key to destination. Return True iff the
+    program was in the cache. """
+    if cacheSize() == 0:
+        return False
+    cachedFile = os.path.join(CACHE_DIRECTORY, key)
+    try:
+        shutil.copy2(cachedFile, destination)
+    except FileNotFoundError:
+        return False
+    # Mark the entry as recently used
+    os.utime(cachedFile)
+    return True
+
+def store(key, compiledFile):
+    """ Add compiledFile to the cache under the given key, then evict entries if the cache
+    is too large. Does nothing if compiledFile does not exist. """
+    maxSize = cacheSize()
+    if maxSize == 0 or not os.path.isfile(compiledFile):
+        return
+    os.makedirs(CACHE_DIRECTORY, exist_ok = True)
+    # Copy to a temporary name first, so a concurrent fetch never sees a partial file
+    fd, tempName = tempfile.mkstemp(dir = CACHE_DIRECTORY, prefix = ".tmp")
+    os.close(fd)
+    try:
+        shutil.copy2(compiledFile, tempName)
+        os.replace(tempName, os.path.join(CACHE_DIRECTORY, key))
+    except BaseException:
+        os.remove(tempName)
+        raise
+    evict(maxSize)
+
+def evict(maxSize):
+    """ Delete the least recently used entries until the cache takes up at most maxSize bytes. """
+    entries = []
+    with os.scandir(CACHE_DIRECTORY) as scan:
+        for entry in scan:
+            if entry.is_file() and not entry.name.startswith(".tmp"):
+                entryStat = entry.stat()
+                entries.append((entryStat.st_mtime_ns, entryStat.st_size, entry.path))
+    totalSize = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if totalSize <= maxSize:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        totalSize -= size
@@ -1,18 +1,84 @@
-""" Module for managing the cpu configuration file, and loading files from the configuration folder. """
+""" Module for managing the cpu configuration file, and loading files from the configuration folder.
+
+The configuration is read from up to three layers, each overriding the one before it:
+    - the global config.json in the configuration folder,
+    - the .cpu.config.json file of the contest folder, if any,
+    - the .cpu.config.json file of the problem folder, if any.
+The merged configuration is cached, and only read again when one of these files changes. """
 
 # For path manipulation
 import os
 # The config file is JSON
 import json
 
+from compprogutils import tracing
+
 CONF_DIRECTORY = os.path.join(os.path.expanduser("~"), ".cpu")
+LOCAL_CONFIG_NAME = ".cpu.config.json"
 
-def getConfig():
-    """ Return a dict object with the config file."""
-    with open(os.path.join(CONF_DIRECTORY, "config.json")) as configFile:
-        return json.load(configFile)
+# The merged configuration, along with the stamps of the files it was read from
+_configCache = {"stamps" : None, "config" : None}
+# Values computed from the configuration, cleared whenever it is read again
+_derivedCache = {}
 
 def configFilePath(fileName):
     """ Prepends CONF_DIRECTORY to the given filename. """
     return os.path.join(CONF_DIRECTORY, fileName)
 
+def configLayers():
+    """ Return the names of the config files that apply to the current directory, from the lowest
+    priority to the highest. Only the global config file needs to exist. """
+    layers = [configFilePath("config.json")]
+    if os.path.isfile(".cpu.problem_manifest.json"):
+        if os.path.isfile(os.path.join(os.pardir, ".cpu.contest_manifest.json")):
+            layers.append(os.path.join(os.pardir, LOCAL_CONFIG_NAME))
+        layers.append(LOCAL_CONFIG_NAME)
+    elif os.path.isfile(".cpu.contest_manifest.json"):
+        layers.append(LOCAL_CONFIG_NAME)
+    return layers
+
+def _fileStamp(fileName):
+    """ Return a value that changes whenever the file with the given name is modified,
+    or None if it does not exist. """
+    try:
+        fileStat = os.stat(fileName)
+    except FileNotFoundError:
+        return None
+    return (fileStat.st_mtime_ns, fileStat.st_size, fileStat.st_ino)
+
+def _mergeConfig(base, override):
+    """ Return base with the keys of override added. Dicts present in both are merged recursively. """
+    merged = dict(base)
+    for key, value in override.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = _mergeConfig(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+def getConfig():
+    """ Return a dict object with the config file. The dict must not be modified. """
+    layers = configLayers()
+    stamps = [(os.path.abspath(layer), _fileStamp(layer)) for layer in layers]
+    if _configCache["stamps"] == stamps:
+        return _configCache["config"]
+    config = {}
+    with tracing.span("getConfig", layers = layers):
+        for layer, (_, stamp) in zip(layers, stamps):
+            # The global config file must exist; the others are optional
+            if stamp is None and layer != layers[0]:
+                continue
+            with open(layer) as configFile:
+                config = _mergeConfig(config, json.load(configFile))
+    _configCache["stamps"] = stamps
+    _configCache["config"] = config
+    _derivedCache.clear()
+    return config
+
+def derivedValue(key, compute):
+    """ Return compute(), caching the result under key until the configuration changes.
+    Use this for values that only depend on the configuration and on key. """
+    getConfig()
+    if key not in _derivedCache:
+        _derivedCache[key] = compute()
+    return _derivedCache[key]
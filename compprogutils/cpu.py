@@ -1,41 +1,61 @@
 # For automatic problem name generation
-import itertools, functools
+import itertools, functools, collections
 from string import ascii_uppercase
 # For parsing cmdline args
 import argparse as ap
-# For processing manifest files
-import json
-import os, errno, shutil
-# For table pretty printing
-import terminaltables
+import os, shutil, sys
 
-from compprogutils import cpu_errors, manifests, executables, generators, tests, solutions, checkers, utilities, configuration
+from compprogutils import cpu_errors, utilities, tracing
 
-parser = ap.ArgumentParser(description = """Competitive programming utilities.
+# Most commands only need some of these modules, so they are only loaded once used
+manifests, executables, generators, tests, solutions, checkers, configuration, judging, stress, server = \
+    map(utilities.lazyImport, ["compprogutils.manifests", "compprogutils.executables", "compprogutils.generators",
+                               "compprogutils.tests", "compprogutils.solutions", "compprogutils.checkers",
+                               "compprogutils.configuration", "compprogutils.judging", "compprogutils.stress",
+                               "compprogutils.server"])
+verdict_cache, timing, blobs = map(utilities.lazyImport, ["compprogutils.verdict_cache", "compprogutils.timing",
+                                                           "compprogutils.blobs"])
+terminaltables = utilities.lazyImport("terminaltables")
 
-Use this to make setting up files for doing things in contests easier.""")
+PARSER_DESCRIPTION = """Competitive programming utilities.
 
-subparser = parser.add_subparsers(dest = "main_command", required = True)
+Use this to make setting up files for doing things in contests easier."""
+
+# Maps each command name to its handler, arguments and aliases
+SUBCOMMANDS = {}
 
 def argument(*name_or_flags, **kwargs):
     """ Helper function to format data for decorating with `subcommand`. """
     return name_or_flags, kwargs
 
-def subcommand(*sub_args, parent=subparser, aliases = []):
+def subcommand(*sub_args, aliases = []):
     # stolen from https://gist.github.com/mivade/384c2c41c3a29c637cb6c603d4197f9f
-    """ Helper function to make declaring subcommands more sane. """
+    """ Helper function to make declaring subcommands more sane. The command's
+    parser is only built when buildParser is called. """
     def decorator(func):
         commandName = func.__name__.replace('_', '-')
-        parser = parent.add_parser(commandName, description=func.__doc__, aliases = aliases)
-        for args, kwargs in sub_args:
-            parser.add_argument(*args, **kwargs)
-        parser.set_defaults(handler=func)
+        SUBCOMMANDS[commandName] = (func, sub_args, aliases)
         @functools.wraps(func)
         def decoratedFunc(**kwargs):
             return func(ap.Namespace(**kwargs))
         return decoratedFunc
     return decorator
 
+def buildParser(commandName = None):
+    """ Build the parser for cpu's command line. If commandName is the name or alias of a command,
+    only that command's parser is built, which is all that is needed to parse its arguments. """
+    parser = ap.ArgumentParser(description = PARSER_DESCRIPTION)
+    parser.add_argument("--trace", type = str, help = "append timed spans to this file, in the Chrome trace format")
+    subparser = parser.add_subparsers(dest = "main_command", required = True)
+    chosenCommands = {name: spec for name, spec in SUBCOMMANDS.items()
+                      if commandName == name or commandName in spec[2]}
+    for name, (func, sub_args, aliases) in (chosenCommands or SUBCOMMANDS).items():
+        commandParser = subparser.add_parser(name, description=func.__doc__, aliases = aliases)
+        for args, kwargs in sub_args:
+            commandParser.add_argument(*args, **kwargs)
+        commandParser.set_defaults(handler=func)
+    return parser
+
 def _add_problem(problemName):
     """ Adds a problem witht the given name to the contest. More specifically:
     - create a directory for the problem
@@ -119,14 +139,40 @@ def compile_solution(args):
         utilities.requirePresentKey(m["solutions"], args.sol_name, "solution")
         m["solutions"][args.sol_name].compile(args.custom_compile, os.path.join("programs", "solutions"))
 
+def _megabytes(amount):
+    """ Convert an amount of megabytes from the command line into bytes. None is kept as is. """
+    return None if amount is None else amount * 1024 * 1024
+
+def _printResourceUsage(runResult):
+    """ Print the wall time, CPU time and peak memory used in runResult. """
+    print(f"Solution executed in {runResult.timeElapsed:.3f} seconds", end = "")
+    peakMemory = "unknown" if runResult.peakMemory is None else utilities.humanizeFileSize(runResult.peakMemory)
+    print(f" ({runResult.cpuTime:.3f} s CPU, {peakMemory} peak memory)")
+
+def _printTimingSummary(timingSummary):
+    """ Print the summary of repeated runs given by timing.TimingSamples.summary. """
+    for name, stats in [("Wall time", timingSummary["wall"]), ("CPU time", timingSummary["cpu"])]:
+        print(f"{name}: min {stats['min']:.3f} s, median {stats['median']:.3f} s, p95 {stats['p95']:.3f} s")
+
+def _cpuAffinity(pin):
+    """ Convert the CPUs given to --pin into the cpuAffinity argument of Executable.run. """
+    return None if pin is None else sorted(set(pin))
+
 @subcommand(argument("sol_name", type=str),
             argument("--time-limit", "-t", type=int),
+            argument("--memory-limit", "-m", type=int),
             argument("--input-test", "-i", type=str),
             argument("--silent", "-s", action="store_true"),
+            argument("--repeat", "-r", type=int, default=1),
+            argument("--warmup", "-w", type=int, default=0),
+            argument("--pin", type=int, nargs="+"),
             aliases = ["rs"])
 def run_solution(args):
     """ Run the registered solution. Receive input from STDIN (or the specified test)
-    and output to STDOUT. Print additional information if -s is not given."""
+    and output to STDOUT. Print additional information if -s is not given. If --memory-limit
+    is given, stop the solution if it uses more than that many megabytes of memory.
+    If --repeat is given along with a test, time that many more runs, after --warmup runs, and print
+    the min, median and 95th percentile of their times. If --pin is given, only run the solution on those CPUs."""
     with manifests.modifyManifest("problem") as m:
         utilities.requirePresentKey(m["solutions"], args.sol_name, "solution")
         solExec = m["solutions"][args.sol_name]
@@ -135,19 +181,29 @@ def run_solution(args):
             utilities.requirePresentKey(m["tests"], args.input_test, "test")
             testOrigin = m["tests"][args.input_test]
             with testOrigin.getFileObject(tests.TestFile.INPUT) as inputFile:
-                solResult = solExec.run(timeout = args.time_limit, fileInput = inputFile)
+                solResult = solExec.run(timeout = args.time_limit, fileInput = inputFile,
+                                        memoryLimit = _megabytes(args.memory_limit), cpuAffinity = _cpuAffinity(args.pin))
                 print(solResult.output)
                 if solResult.data is not None:
                     print("> Solution also gave the following data:")
                     print(solResult.data)
         else:
             try:
-                solResult = solExec.run(timeout = args.time_limit, pipeToTerminal = True)
+                solResult = solExec.run(timeout = args.time_limit, pipeToTerminal = True,
+                                        memoryLimit = _megabytes(args.memory_limit), cpuAffinity = _cpuAffinity(args.pin))
             except KeyboardInterrupt:
                 if not args.silent:
                     print("<Solution interrupted>")
         if not args.silent and solResult is not None:
-            print(f"Solution executed in {solResult.timeElapsed:.3f} seconds")
+            _printResourceUsage(solResult)
+        if args.repeat > 1:
+            if args.input_test is None:
+                print("Repeated runs need a test to read input from; use -i")
+                return
+            samples = timing.measure(solExec, testOrigin, args.repeat, args.warmup, timeout = args.time_limit,
+                                     memoryLimit = _megabytes(args.memory_limit), cpuAffinity = _cpuAffinity(args.pin))
+            print(f"Timed {args.repeat} runs after {args.warmup} warmup runs:")
+            _printTimingSummary(samples.summary())
 
 @subcommand(argument("sol_name", type=str))
 def delete_solution(args):
@@ -173,14 +229,27 @@ def add_generator(args):
 
 @subcommand(argument("file_name", type=str),
             argument("--name", "-n", type=str),
+            argument("--persistent", "-p", action="store_true"),
             aliases = ["ac"])
 def add_checker(args):
-    """ Add a test checker. If --name is not given, use file_name after stripping extensions. """
+    """ Add a test checker. If --name is not given, use file_name after stripping extensions.
+    If --persistent is given, the checker is started once and checks every test, instead of being
+    started once per test; it must support this, e.g. by using checker_utils.serveFromStreams. """
     utilities.requireFileExists(args.file_name)
     if args.name is None:
         args.name = os.path.splitext(args.file_name)[0]
     with manifests.modifyManifest("problem") as m:
-        m["checkers"][args.name] = checkers.Checker(args.name, args.file_name)
+        m["checkers"][args.name] = checkers.Checker(args.name, args.file_name, persistent = args.persistent)
+    print(f"Checker {args.name} added!")
+
+@subcommand(argument("--name", "-n", type=str, default="tokens"),
+            argument("--float-tolerance", "-f", type=float))
+def add_token_checker(args):
+    """ Add a checker built into cpu, which compares outputs token by token and ignores whitespace.
+    If --float-tolerance is given, numbers may differ from the expected output by that much, absolutely
+    or relatively. The checker is named `tokens` unless --name is given. """
+    with manifests.modifyManifest("problem") as m:
+        m["checkers"][args.name] = checkers.TokenChecker(args.name, args.float_tolerance)
     print(f"Checker {args.name} added!")
 
 @subcommand(argument("check_name", type=str))
@@ -191,6 +260,12 @@ def set_checker(args):
     with manifests.modifyManifest("problem") as m:
         m["default_checker"] = args.check_name
 
+@subcommand(argument("sol_name", type=str))
+def set_main_solution(args):
+    """ Set the main solution of the problem to the named solution. judge-contest judges this solution. """
+    with manifests.modifyManifest("problem") as m:
+        utilities.requirePresentKey(m["solutions"], args.sol_name, "solution")
+        m["main_solution"] = args.sol_name
 
 @subcommand(argument("--with-gen", "-g", type=str),
             aliases = ["at"])
@@ -216,14 +291,76 @@ def add_test(args):
         m["tests"][newTest.ID] = newTest
         return newTest.ID
 
+@subcommand(argument("gen_name", type=str),
+            argument("--count", "-c", type=int, default=1),
+            argument("--seed-from", type=int, default=1),
+            argument("--jobs", "-j", type=int, default=1),
+            argument("--timeout", "-t", type=int),
+            aliases = ["gt"])
+def gen_tests(args):
+    """ Add --count new tests, with inputs made by the given generator. The k-th new test (counting from 0)
+    passes seed_from + k to the generator as its only argument. If --jobs is given, run up to that many
+    generators at the same time. If --timeout is given, stop a generator after -t seconds; its test is
+    not added.
+
+    As a function, return the list of new test IDs."""
+    genExec = generators.getGen(args.gen_name)
+    with manifests.modifyManifest("problem") as m:
+        newTests = [tests.Test(newID) for newID in itertools.islice(tests.unusedTestIDs(m["tests"]), args.count)]
+        print(f"Generating {len(newTests)} tests...")
+        try:
+            errors = generators.generateInputs(genExec, newTests, args.seed_from, args.jobs, args.timeout)
+        except BaseException:
+            # The manifest is left unchanged, so the new files would be orphaned
+            for newTest in newTests:
+                newTest.deleteFiles()
+            raise
+        newIDs = []
+        for seed, newTest, error in zip(itertools.count(args.seed_from), newTests, errors):
+            if error is None:
+                m["tests"][newTest.ID] = newTest
+                newIDs.append(newTest.ID)
+            else:
+                print(f"Generator failed with seed {seed} ({error.__class__.__name__}): {error.message}")
+    if newIDs:
+        print(f"Generated {len(newIDs)} tests as tests {newIDs[0]} to {newIDs[-1]}")
+    return newIDs
+
+@subcommand(argument("directory", type=str),
+            argument("--link", "-l", action="store_true"),
+            aliases = ["it"])
+def import_tests(args):
+    """ Add every test in the given directory. A test is made of files with the same name, with the
+    extensions .in (input), .out or .ans (output), and .data (data). Tests are added in natural order
+    of their names. If --link is given, hard link the files instead of copying them; the linked files
+    must not be modified in place afterwards.
+
+    As a function, return the list of new test IDs."""
+    testFiles = tests.findTestFiles(args.directory)
+    newIDs = []
+    with manifests.modifyManifest("problem") as m:
+        for (name, files), newID in zip(testFiles, tests.unusedTestIDs(m["tests"])):
+            newTest = tests.Test(newID)
+            for testFile, path in files.items():
+                utilities.copyOrLink(path, newTest.getFilename(testFile), args.link)
+            m["tests"][newID] = newTest
+            newIDs.append(newID)
+    if newIDs:
+        print(f"Imported {len(newIDs)} tests from {args.directory} as tests {newIDs[0]} to {newIDs[-1]}")
+    else:
+        print(f"No tests found in {args.directory}")
+    return newIDs
+
 @subcommand(argument("sol_name", type=str),
             argument("--timeout", "-t", type=int),
+            argument("--jobs", "-j", type=int, default=1),
             argument("tests", type=str, nargs="*"),
             aliases = ["mo"])
 def make_output(args):
     """ Use the sol in sol_name to generate the output for the tests listed. If no tests are listed,
     the output generator is run for all tests. If --timeout is given, stop running the solution after
-    -t seconds. """
+    -t seconds. If --jobs is given, run up to that many tests at the same time. A test whose solution
+    fails keeps its old output. As a function, return the names of the tests whose output was not generated. """
     mf = manifests.loadManifestType("problem")
     if args.tests == []:
         args.tests = list(mf["tests"].keys())
@@ -232,20 +369,45 @@ def make_output(args):
     utilities.requirePresentKey(mf["solutions"], args.sol_name, "solution")
     testsToGenerate = {testName: mf["tests"][testName] for testName in args.tests}
     solExec = mf["solutions"][args.sol_name]
-    for testGName, testg in testsToGenerate.items():
-        print(f"Generating output for test {testGName}...")
-        with testg.getFileObject(tests.TestFile.INPUT, "rb") as inputFile:
-            with testg.getFileObject(tests.TestFile.OUTPUT, "wb") as outputFile:
-                solExec.run(fileInput = inputFile, fileToWrite = outputFile, timeout = args.timeout)
-        print(f"Output generated!")
+    print(f"Generating output for {len(testsToGenerate)} tests...")
+    summaryTable = terminaltables.SingleTable([["Test", "Time", "Result"]])
+    summaryTable.title = f"Outputs from {args.sol_name}"
+    failures = []
+    for testName, timeElapsed, error in judging.makeOutputs(solExec, testsToGenerate, jobs = args.jobs,
+                                                           timeout = args.timeout):
+        if error is None:
+            summaryTable.table_data.append([testName, f"{timeElapsed:.3f} s", "Generated"])
+        else:
+            summaryTable.table_data.append([testName, "-", error.__class__.__name__])
+            failures.append((testName, error))
+    print(summaryTable.table)
+    print(f"Output generated for {len(testsToGenerate) - len(failures)} of {len(testsToGenerate)} tests")
+    for testName, error in failures:
+        print(f"Test {testName} failed with {error.__class__.__name__}: {error.message}")
+    return [testName for testName, _ in failures]
 
 @subcommand(argument("sol_name", type=str),
             argument("--timeout", "-t", type=int),
+            argument("--memory-limit", "-m", type=int),
+            argument("--cpu-limit", type=float),
+            argument("--output-limit", type=int),
+            argument("--jobs", "-j", type=int, default=1),
+            argument("--incremental", "-i", action="store_true"),
+            argument("--repeat", "-r", type=int, default=1),
+            argument("--warmup", "-w", type=int, default=0),
+            argument("--pin", type=int, nargs="+"),
             argument("tests", type=str, nargs="*"),
             aliases = ["ts"])
 def test_solution(args):
     """ Run `tests` on the given solution. If tests is not given, use all tests.
-    If --timeout is given, stop running the solution after -t seconds.
+    If --timeout is given, stop running the solution after -t seconds. If --memory-limit
+    or --cpu-limit are given, report a solution using more than that many megabytes of memory
+    or seconds of CPU time as MLE or TLE. If --output-limit is given, stop a solution printing
+    more than that many megabytes and report it as OLE. If --jobs is given, run up to that many tests at the same time.
+    Verdicts are recorded in the problem's verdict cache. If --incremental is given, only run the tests whose
+    solution, checker, files or limits changed since their verdict was recorded, and reuse the other verdicts.
+    If --repeat is given, time that many more runs of each passing test, after --warmup runs, and print the min,
+    median and 95th percentile of their times. If --pin is given, only run the solution on those CPUs.
     As a function, return the minimum score given by the checker for any of the tests.
     """
     mf = manifests.loadManifestType("problem")
@@ -264,61 +426,201 @@ def test_solution(args):
     print(f"All info ready. Running tests:")
     extraVerdicts = set()
     totalScore = 1
-    for testName, testPackage in testsToRun.items():
-        print(testPackage.testDisplayTable(maxLines = 3).table)
-        if not testPackage.checkFileExists(tests.TestFile.OUTPUT):
-            print(f"!!! Test has no output to check, skipping")
-            continue
-        outputCheckName = os.path.join("outputs", f"{args.sol_name}_out.txt")
-        with open(outputCheckName, "w") as outputToCheck:
-            with testPackage.getFileObject(tests.TestFile.INPUT, "r") as testInput:
-                try:
-                    solutionRunData = solExec.run(timeout = args.timeout, fileInput = testInput,
-                                fileToWrite = outputToCheck)
-                    print(f"Solution executed in {solutionRunData.timeElapsed:.3f} seconds")
-                except cpu_errors.SolutionTimeout as ce:
-                    print(f"Solution exceeded time limit. Skipping.")
-                    extraVerdicts.add("TLE")
-                    totalScore = 0
-                    continue
-                except cpu_errors.SolutionExecution as ce:
-                    print(f"Runtime error: {ce.message}")
-                    extraVerdicts.add("RTE")
-                    print(f"Skipping.")
-                    totalScore = 0
-                    continue
-        print("Output:")
-        print(*utilities.wrapFileContentsList(outputCheckName, shutil.get_terminal_size()[1], 5), sep="\n")
-        score, notes = checkerExec.checkOutputFile(testPackage, outputCheckName)
-        print(f"Checker notes: {notes.rstrip()}")
-        print("Checker verdict:", checkers.getVerdictString(score), end="\n\n")
-        totalScore = min(totalScore, score)
+    outputPrefix = os.path.join("outputs", f"{args.sol_name}_out")
+    verdictCache = verdict_cache.VerdictCache.load()
+    try:
+        for verdict in judging.judgeTestsIncrementally(solExec, checkerExec, testsToRun, outputPrefix, verdictCache,
+                                                       reuse = args.incremental, jobs = args.jobs,
+                                                       timeout = args.timeout, memoryLimit = _megabytes(args.memory_limit),
+                                                       cpuLimit = args.cpu_limit, outputLimit = _megabytes(args.output_limit),
+                                                       cpuAffinity = _cpuAffinity(args.pin), repeat = args.repeat,
+                                                       warmup = args.warmup):
+            _printVerdict(testsToRun[verdict.testName], verdict)
+            if verdict.error is not None:
+                extraVerdicts.add(verdict.error)
+            if not verdict.skipped:
+                totalScore = min(totalScore, verdict.score)
+    finally:
+        # Keep the verdicts of the tests judged so far, even if judging was interrupted
+        verdictCache.forgetTestsExcept(mf["tests"].keys())
+        verdictCache.save()
     print("Minimum score received:", checkers.getVerdictString(totalScore))
     if len(extraVerdicts) > 0:
         print("Additionally, it received the following errors:", *extraVerdicts)
     return totalScore
 
+@tracing.traced("display")
+def _printVerdict(testPackage, verdict):
+    """ Print the judging details of a single test, as given in the TestVerdict verdict. """
+    print(testPackage.testDisplayTable(maxLines = 3).table)
+    if verdict.cached:
+        print("(Verdict unchanged since the last run)")
+    if verdict.skipped:
+        print(f"!!! Test has no output to check, skipping")
+        return
+    if verdict.error == "TLE":
+        print(f"Solution exceeded time limit. Skipping.")
+        return
+    if verdict.error == "MLE":
+        print(f"Solution exceeded memory limit. Skipping.")
+        return
+    if verdict.error == "OLE":
+        print(f"Solution exceeded output limit. Skipping.")
+        return
+    if verdict.error == "RTE":
+        print(f"Runtime error: {verdict.notes}")
+        print(f"Skipping.")
+        return
+    _printResourceUsage(verdict)
+    if verdict.timing is not None:
+        _printTimingSummary(verdict.timing)
+    print("Output:")
+    print(*verdict.outputPreview, sep="\n")
+    print(f"Checker notes: {verdict.notes.rstrip()}")
+    print("Checker verdict:", checkers.getVerdictString(verdict.score), end="\n\n")
+
+@subcommand(argument("--timeout", "-t", type=int),
+            argument("--memory-limit", "-m", type=int),
+            argument("--cpu-limit", type=float),
+            argument("--output-limit", type=int),
+            argument("--jobs", "-j", type=int, default=os.cpu_count()),
+            argument("problems", type=str, nargs="*"))
+def judge_contest(args):
+    """ Compile the main solution of each problem in `problems` (see set-main-solution), and judge it against
+    all of the problem's tests. If no problems are given, judge every problem with a main solution. All tests
+    of all problems are run on a single pool of --jobs workers (by default, one per core). The limits are
+    as in test-solution. Print a table of the verdicts and times of each problem.
+    As a function, return a dict mapping each judged problem to the minimum score of its solution. """
+    mf = manifests.loadManifestType("contest")
+    if args.problems == []:
+        args.problems = list(mf.keys())
+    for problemName in args.problems:
+        utilities.requirePresentKey(mf, problemName, "problem")
+    runOptions = {"timeout" : args.timeout, "memoryLimit" : _megabytes(args.memory_limit),
+                  "cpuLimit" : args.cpu_limit, "outputLimit" : _megabytes(args.output_limit)}
+    problemTests = []
+    # The problem each entry of problemTests belongs to
+    testProblems = []
+    mainSolutions = {}
+    for problemName in args.problems:
+        problemDirectory = os.path.abspath(mf[problemName])
+        with utilities.cd(problemDirectory):
+            pmf = manifests.loadManifestType("problem")
+            solName = pmf.get("main_solution")
+            if solName is None:
+                print(f"Problem {problemName} has no main solution, skipping")
+                continue
+            utilities.requirePresentKey(pmf["checkers"], pmf["default_checker"], "checker")
+            print(f"Compiling {solName} for problem {problemName}...")
+            with manifests.modifyManifest("problem") as m:
+                m["solutions"][solName].compile(outputDirectory = os.path.join("programs", "solutions"))
+                solExec = m["solutions"][solName]
+            checkerExec = pmf["checkers"][pmf["default_checker"]]
+            if not checkerExec.precompiled:
+                checkerExec.compile(outputDirectory = os.path.join("programs", "checkers"))
+            mainSolutions[problemName] = solName
+            problemTests += [(problemDirectory, solExec, checkerExec, testName, testPackage, runOptions)
+                             for testName, testPackage in pmf["tests"].items()]
+            testProblems += [problemName] * len(pmf["tests"])
+    print(f"Judging {len(problemTests)} tests of {len(mainSolutions)} problems:")
+    verdicts = {problemName: [] for problemName in mainSolutions}
+    for problemName, verdict in zip(testProblems, judging.judgeContestTests(problemTests, jobs = args.jobs)):
+        verdicts[problemName].append(verdict)
+    verdictNames = ["AC", "PC", "WA", "TLE", "MLE", "OLE", "RTE", "SKIP"]
+    resultTable = terminaltables.SingleTable([["Problem", "Solution", "Score", *verdictNames, "Max time", "Total time"]])
+    resultTable.title = "Contest results"
+    for problemName, problemVerdicts in verdicts.items():
+        verdictCounts = collections.Counter(verdict.verdictName for verdict in problemVerdicts)
+        times = [verdict.timeElapsed for verdict in problemVerdicts if verdict.timeElapsed is not None]
+        resultTable.table_data.append([problemName, mainSolutions[problemName],
+                                       checkers.getVerdictString(judging.minimumScore(problemVerdicts)),
+                                       *(verdictCounts[verdictName] for verdictName in verdictNames),
+                                       f"{max(times, default = 0):.3f} s", f"{sum(times):.3f} s"])
+    print(resultTable.table)
+    return {problemName: judging.minimumScore(problemVerdicts) for problemName, problemVerdicts in verdicts.items()}
+
+@subcommand(argument("first_sol_name", type=str),
+            argument("second_sol_name", type=str),
+            argument("--timeout", "-t", type=int),
+            argument("--repeat", "-r", type=int, default=10),
+            argument("--warmup", "-w", type=int, default=1),
+            argument("--pin", type=int, nargs="+"),
+            argument("--alpha", type=float, default=0.05),
+            argument("tests", type=str, nargs="*"))
+def compare_perf(args):
+    """ Compare the CPU times of two solutions on `tests` (by default, all tests). Each test is run --repeat
+    times by each solution, after --warmup runs, alternating between the two. A test is flagged as a regression
+    or an improvement of the second solution if the Mann-Whitney U test says that the difference in CPU times
+    is significant at level --alpha. If --pin is given, only run the solutions on those CPUs.
+    As a function, return a dict mapping each flagged test to "regression" or "improvement". """
+    mf = manifests.loadManifestType("problem")
+    if args.tests == []:
+        args.tests = list(mf["tests"].keys())
+    for testName in args.tests:
+        utilities.requirePresentKey(mf["tests"], testName, "test")
+    for solName in [args.first_sol_name, args.second_sol_name]:
+        utilities.requirePresentKey(mf["solutions"], solName, "solution")
+    firstExec, secondExec = mf["solutions"][args.first_sol_name], mf["solutions"][args.second_sol_name]
+    resultTable = terminaltables.SingleTable([["Test", f"{args.first_sol_name} median", f"{args.second_sol_name} median",
+                                               "Change", "p-value", "Result"]])
+    resultTable.title = f"CPU time, {args.repeat} runs per test"
+    flagged = {}
+    for testName in args.tests:
+        print(f"Timing test {testName}...", end = "\r", flush = True)
+        firstSamples, secondSamples = timing.measurePair(firstExec, secondExec, mf["tests"][testName], args.repeat,
+                                                         args.warmup, timeout = args.timeout,
+                                                         cpuAffinity = _cpuAffinity(args.pin))
+        firstMedian = timing.summarize(firstSamples.cpuTimes)["median"]
+        secondMedian = timing.summarize(secondSamples.cpuTimes)["median"]
+        pValue = timing.mannWhitneyU(firstSamples.cpuTimes, secondSamples.cpuTimes)
+        result = ""
+        if pValue < args.alpha:
+            result = flagged[testName] = "regression" if secondMedian > firstMedian else "improvement"
+        change = f"{(secondMedian / firstMedian - 1) * 100:+.1f}%" if firstMedian > 0 else "-"
+        resultTable.table_data.append([testName, f"{firstMedian:.4f} s", f"{secondMedian:.4f} s", change,
+                                       f"{pValue:.3f}", result])
+    print()
+    print(resultTable.table)
+    regressions = [testName for testName, result in flagged.items() if result == "regression"]
+    if regressions:
+        print(f"{args.second_sol_name} is significantly slower on tests", *regressions)
+    return flagged
+
 @subcommand(argument("stress_sol_name", type=str),
             argument("ac_sol_name", type=str),
             argument("gen_name", type=str),
+            argument("--timeout", "-t", type=int),
+            argument("--jobs", "-j", type=int, default=1),
+            argument("--seed-from", type=int),
             argument("-r", "--rounds", type=int, default=-1))
 def stress_test(args):
     """ Writes a test for which stress_sol_name is marked wrong, using ac_sol_name to generate
-    correct output. Performs (--rounds) attempts (by default, infinite) """
-    # recompile the generator
-    failedRounds = 0
-    while args.rounds == -1 or failedRounds < args.rounds:
-        print(f"Attempt {failedRounds + 1}:")
-        attemptTest = add_test(with_gen = args.gen_name)
-        make_output(sol_name = args.ac_sol_name, tests = [attemptTest], timeout = None)
-        if test_solution(sol_name = args.stress_sol_name, timeout = None, tests = [attemptTest]) < 1:
-            print(f"Solution {args.stress_sol_name} breaks under test {attemptTest}")
-            break
-        else:
-            delete_tests(tests = [attemptTest])
-        failedRounds += 1
-    else:
-        print(f"Failed to break solution {args.stress_sol_name}")
+    correct output. Performs (--rounds) attempts (by default, infinite). If --timeout is given,
+    stop running either solution after -t seconds. If --jobs is given, run that many attempts
+    at the same time. If --seed-from is given, attempt k passes seed_from + k - 1 to the generator
+    as its argument; use this with --jobs so that the attempts get different tests. """
+    mf = manifests.loadManifestType("problem")
+    utilities.requirePresentKey(mf["solutions"], args.stress_sol_name, "solution")
+    utilities.requirePresentKey(mf["solutions"], args.ac_sol_name, "solution")
+    utilities.requirePresentKey(mf["generators"], args.gen_name, "generator")
+    utilities.requirePresentKey(mf["checkers"], mf["default_checker"], "checker")
+    genExec = mf["generators"][args.gen_name]
+    genExec.compile(outputDirectory = os.path.join("programs", "generators"))
+    checkerExec = mf["checkers"][mf["default_checker"]]
+    if not checkerExec.precompiled:
+        checkerExec.compile(outputDirectory = os.path.join("programs", "checkers"))
+    with stress.StressEngine(genExec, mf["solutions"][args.ac_sol_name], mf["solutions"][args.stress_sol_name],
+                             checkerExec, timeout = args.timeout) as engine:
+        failure = engine.findFailure(args.rounds, args.jobs, args.seed_from,
+                                     onRoundStart = lambda k: print(f"Attempt {k}", end = "\r", flush = True))
+        print()
+        if failure is None:
+            print(f"Failed to break solution {args.stress_sol_name}")
+            return
+        roundTest, verdict = failure
+        _printVerdict(roundTest, verdict)
+        attemptTest = stress.persistTest(roundTest)
+        print(f"Solution {args.stress_sol_name} breaks under test {attemptTest}")
 
 @subcommand(argument("--summary", "-s", action="store_true"),
             argument("--truncate", "-t", type=int, default=5),
@@ -332,11 +634,12 @@ def list_tests(args):
         args.tests = list(mf["tests"].keys())
     for testName in args.tests:
         utilities.requirePresentKey(mf["tests"], testName, "test")
+    # Each test is printed as soon as it is rendered, so long listings start showing at once, even through a pipe
     for testName in args.tests:
         if args.summary:
-            print(str(mf["tests"][testName]))
+            print(str(mf["tests"][testName]), flush = True)
         else:
-            print(mf["tests"][testName].testDisplayTable(args.truncate).table)
+            print(mf["tests"][testName].testDisplayTable(args.truncate).table, flush = True)
 
 @subcommand(argument("tests", type=str, nargs="*"),
             aliases = ["dt"])
@@ -355,13 +658,69 @@ def delete_tests(args):
             del m["tests"][testName]
             print(f"Test {testName} deleted")
 
-def main():
-    args = parser.parse_args()
+@subcommand(argument("tests", type=str, nargs="*"),
+            argument("--compress", "-c", choices=["gzip", "zstd"]),
+            aliases = ["pt"])
+def pack_tests(args):
+    """ Move the files of the tests in `tests` (all tests if none are given) into the blob store in the
+    configuration folder. Identical files, in any problem, are then stored only once. If --compress is
+    given, store them compressed with gzip or zstd (zstd needs the zstandard package). Stored tests are
+    used like any other; they are unpacked when written to. Blobs no test uses anymore are deleted.
+    Tests can only be packed if they are on the same filesystem as the configuration folder. """
+    with manifests.modifyManifest("problem") as m:
+        if args.tests == []:
+            args.tests = list(m["tests"].keys())
+        for testName in args.tests:
+            utilities.requirePresentKey(m["tests"], testName, "test")
+        def testFileNames():
+            return [m["tests"][testName].getStoredFilename(testFile) for testName in args.tests for testFile in tests.TestFile]
+        if not all(blobs.canStore(fileName) for fileName in testFileNames() if os.path.isfile(fileName)):
+            print(f"The tests are on another filesystem than the blob store in {blobs.BLOB_DIRECTORY}, so they cannot be linked to it. No tests were packed.")
+            return
+        usageBefore = blobs.diskUsage(testFileNames())
+        for testName in args.tests:
+            m["tests"][testName].storeFiles(args.compress)
+        usageAfter = blobs.diskUsage(testFileNames())
+    freed = blobs.collectGarbage()
+    print(f"Packed {len(args.tests)} tests: {utilities.humanizeFileSize(usageBefore)} now take up {utilities.humanizeFileSize(usageAfter)}")
+    if freed:
+        print(f"Deleted unused blobs taking up {utilities.humanizeFileSize(freed)}")
+
+@subcommand(argument("--stop", action="store_true"))
+def daemon(args):
+    """ Start the cpu daemon for this contest. While it runs, cpu commands in the contest are run by the
+    daemon, which keeps manifests and configuration loaded between commands. If --stop is given, stop it. """
+    directory = server.contestDirectory()
+    if args.stop:
+        if server.stop(directory):
+            print("Daemon stopped")
+        else:
+            print("No daemon is running for this contest")
+    else:
+        server.start(directory)
+        print(f"Daemon started for {directory}")
+
+def _commandName(argv):
+    """ Return the name or alias of the command in the command line argv, or None if there is none. """
+    commandNames = set(SUBCOMMANDS).union(*(aliases for _, _, aliases in SUBCOMMANDS.values()))
+    return next((arg for arg in argv if arg in commandNames), None)
+
+def runCommand(argv):
+    """ Parse the command line argv (without the program name) and run the command. """
+    args = buildParser(_commandName(argv)).parse_args(argv)
     if args.main_command is None:
         args.print_help()
     else:
+        if args.trace is not None:
+            tracing.start(args.trace)
         try:
-            args.handler(args)
+            # The count covers every command run by this process, which may be a daemon
+            leftoversBefore = executables.leftoverProcessCount()
+            with tracing.span("command", argv = argv):
+                args.handler(args)
+            leftovers = executables.leftoverProcessCount() - leftoversBefore
+            if leftovers:
+                print(f"Killed {leftovers} processes that programs left running after they exited")
         except cpu_errors.CPUException as e:
             print(f"A {e.__class__.__name__} error occured while processing this command!\n")
             print("Details:", e.message)
@@ -370,3 +729,16 @@ def main():
         except Exception as e:
             print(f"An internal error occured while processing this command! Re-raising...")
             raise e
+        finally:
+            tracing.stop()
+
+def main():
+    argv = sys.argv[1:]
+    if os.environ.get(tracing.TRACE_VARIABLE) and "--trace" not in argv:
+        argv = ["--trace", os.path.abspath(os.environ[tracing.TRACE_VARIABLE]), *argv]
+    # Commands are run by the daemon if one is running, except for those that control it
+    if _commandName(argv) != "daemon":
+        exitCode = server.forward(argv)
+        if exitCode is not None:
+            sys.exit(exitCode)
+    runCommand(argv)
@@ -35,9 +35,27 @@ class SolutionExecution(CPUException):
 class SolutionTimeout(CPUException):
     """ Exception raised when the solution times out. """
 
+class SolutionMemoryLimit(CPUException):
+    """ Exception raised when the solution uses more memory than allowed. """
+
+class SolutionOutputLimit(CPUException):
+    """ Exception raised when the solution prints more output than allowed. """
+
+class RunCancelled(CPUException):
+    """ Exception raised when a program is started in a stopped executables.RunScope. """
+
 class MalformedDataDelimiter(CPUException):
     """ Exception raised when more than one DATA_ESCAPE sequence is read.
     when processing solution output."""
 
 class UnexpectedEOF(CPUException):
     """ Exception raised when an unexpected EOF is read during parsing. """
+
+class DaemonError(CPUException):
+    """ Exception raised when the cpu daemon cannot be started or reached. """
+
+class CrossDeviceStore(CPUException):
+    """ Exception raised when a file is stored in a blob store on another filesystem. """
+
+class MissingDependency(CPUException):
+    """ Exception raised when a feature needs a package that is not installed. """
@@ -1,12 +1,529 @@
 """ Module for working with executable files """
 # For manipulating path extensions
-import os
+import os, io
 # internals
-from compprogutils import configuration, cpu_errors, utilities
+from compprogutils import configuration, cpu_errors, utilities, streams, tracing
+# Only needed for compiling
+compile_cache = utilities.lazyImport("compprogutils.compile_cache")
 # For running commands
-import subprocess, shutil
+import subprocess, shutil, functools
 # For timing
-import time
+import time, threading
+from contextlib import contextmanager
+# For running several executables at once. asyncio is slow to import, and single runs do without it
+asyncio = utilities.lazyImport("asyncio")
+# For supervising a single executable
+import selectors
+# For resource accounting and limits
+import sys, math, signal, resource
+
+# ru_maxrss is in kilobytes on Linux, but in bytes on macOS
+MAXRSS_UNIT = 1 if sys.platform == "darwin" else 1024
+# How much output is read from a program at once
+OUTPUT_CHUNK_SIZE = 1 << 16
+# Where memory cannot be sampled, the address space of a program is limited to this many times its
+# memory limit instead. Address space is usually much larger than resident memory, so programs over
+# the memory limit but under this bound still finish, and can be reported as exceeding the memory limit.
+ADDRESS_SPACE_SLACK = 2
+# How often a running program is checked on, in seconds: its peak memory is sampled, and without
+# pidfds, it is checked for having exited
+POLL_INTERVAL = 0.01
+
+class RunResult:
+    """ Object that holds the result of running an executable. Has 4 members:
+        the output, the wall time elapsed, the CPU time (user + system) used, and the peak
+        resident memory in bytes, which is None if it could not be measured. """
+    def __init__(self, output, timeElapsed, cpuTime = None, peakMemory = None):
+        self.output = output
+        self.timeElapsed = timeElapsed
+        self.cpuTime = cpuTime
+        self.peakMemory = peakMemory
+    def __repr__(self):
+        return f"RunResult(output = {self.output}, timeElapsed = {self.timeElapsed}, cpuTime = {self.cpuTime}, peakMemory = {self.peakMemory})"
+
+def _resourceLimiter(memoryLimit, cpuLimit, cpuAffinity = None):
+    """ Return a function that sets the given resource limits and pins the child process to the CPUs
+    in cpuAffinity, to be called in the child process before it executes. Return None if there is
+    nothing to set. The memory limit is only set here if memory cannot be sampled: an address space limit
+    makes allocations far over the memory limit fail, and the program crash rather than exceed it. """
+    if _CAN_SAMPLE_MEMORY:
+        memoryLimit = None
+    if memoryLimit is None and cpuLimit is None and cpuAffinity is None:
+        return None
+    def setLimits():
+        if cpuAffinity is not None:
+            os.sched_setaffinity(0, cpuAffinity)
+        if memoryLimit is not None:
+            addressSpace = memoryLimit * ADDRESS_SPACE_SLACK
+            resource.setrlimit(resource.RLIMIT_AS, (addressSpace, addressSpace))
+        if cpuLimit is not None:
+            # SIGXCPU is sent at the soft limit, and SIGKILL at the hard limit
+            seconds = math.ceil(cpuLimit)
+            resource.setrlimit(resource.RLIMIT_CPU, (seconds, seconds + 1))
+    return setLimits
+
+def _isPlainFile(fileObj):
+    """ Return True iff a process can read fileObj directly: it is a file descriptor, or a file object
+    whose contents are those of its file descriptor. Decompressing readers have a file descriptor too,
+    but it holds the compressed contents. """
+    if fileObj is None or isinstance(fileObj, int):
+        return True
+    return isinstance(getattr(fileObj, "buffer", fileObj), (io.FileIO, io.BufferedReader, io.BufferedRandom))
+
+def _peakResidentMemory(pid):
+    """ Return the peak resident memory of the process with the given pid (or "self") so far, in bytes,
+    or None if it cannot be read. It is read from /proc, which only Linux has, and is gone once the
+    process exits. """
+    try:
+        with open(f"/proc/{pid}/status", "rb") as statusFile:
+            for line in statusFile:
+                if line.startswith(b"VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+_CAN_SAMPLE_MEMORY = _peakResidentMemory("self") is not None
+
+class _MemorySampler:
+    """ Measures the peak resident memory of a running process. Its ru_maxrss is not enough: the process
+    is forked from cpu, and ru_maxrss counts the memory cpu used at that point too. So the peak of the
+    process after it executed its program is sampled as it runs, and used unless ru_maxrss is more than
+    anything it can have inherited from cpu. """
+    def __init__(self, pid):
+        self.pid = pid
+        self.peak = None
+        self.sample()
+
+    def sample(self):
+        """ Read the peak of the process so far. This must be called before the process is reaped. """
+        peak = _peakResidentMemory(self.pid)
+        if peak is not None:
+            self.peak = peak
+
+    def peakMemory(self, usage):
+        """ Return the peak resident memory of the process in bytes, given its resource usage from os.wait4,
+        or None if it is unknown. """
+        maxrss = usage.ru_maxrss * MAXRSS_UNIT
+        # The peak of cpu bounds what the process inherited from it
+        inherited = _peakResidentMemory("self")
+        if inherited is None or maxrss > inherited:
+            return maxrss
+        return self.peak
+
+# Each thread runs concurrent executables on its own event loop, made on first use
+_threadState = threading.local()
+
+def _threadLoop():
+    """ Return the event loop of the current thread. A forked worker process makes its own, as
+    the loop it inherits shares its selector with the parent. """
+    if getattr(_threadState, "pid", None) != os.getpid():
+        _threadState.loop = asyncio.new_event_loop()
+        _threadState.pid = os.getpid()
+    return _threadState.loop
+
+def _cancelTasks(loop, tasks):
+    """ Cancel the unfinished tasks in tasks, and run loop until they have cleaned up. """
+    pending = [task for task in tasks if not task.done()]
+    for task in pending:
+        task.cancel()
+    if pending:
+        loop.run_until_complete(asyncio.gather(*pending, return_exceptions = True))
+
+def iterateConcurrently(coroutines, jobs):
+    """ Run the coroutines in the iterable coroutines on the current thread's event loop, at most
+    jobs at a time, and yield their results in order. Unfinished coroutines are cancelled once
+    the iterator is closed. """
+    loop = _threadLoop()
+    semaphore = asyncio.Semaphore(max(1, jobs))
+    async def limited(coroutine):
+        async with semaphore:
+            return await coroutine
+    tasks = [loop.create_task(limited(coroutine)) for coroutine in coroutines]
+    try:
+        for task in tasks:
+            yield loop.run_until_complete(task)
+    finally:
+        _cancelTasks(loop, tasks)
+
+async def _waitForExit(process):
+    """ Wait until process exits, without reaping it, so it can still be signalled safely and its
+    resource usage can be read with os.wait4. """
+    loop = asyncio.get_running_loop()
+    try:
+        pidfd = os.pidfd_open(process.pid)
+    except (AttributeError, OSError):
+        # Without pidfds (e.g. on macOS), a worker thread waits instead
+        await loop.run_in_executor(None, functools.partial(os.waitid, os.P_PID, process.pid, os.WEXITED | os.WNOWAIT))
+        return
+    exited = loop.create_future()
+    loop.add_reader(pidfd, lambda: exited.done() or exited.set_result(None))
+    try:
+        await exited
+    finally:
+        loop.remove_reader(pidfd)
+        os.close(pidfd)
+
+def _killGroup(process):
+    """ Kill process and every process it started, which share its process group, unless process
+    has been reaped already. """
+    if process.returncode is None:
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+# The process groups of the programs that are running, each with the RunScope it was started in (or None),
+# so they can be killed together. While stopping is set, no new programs are started
+_runningState = {"groups" : {}, "stopping" : False, "lock" : threading.Lock()}
+
+class RunScope:
+    """ A set of programs that can be stopped together, from any thread. The programs a thread starts
+    while it is inside `with scope:` belong to scope. Once scope.stop() is called, they are killed, and
+    starting another program in scope raises RunCancelled. """
+    def __init__(self):
+        self.stopped = False
+        self.outerScope = None
+
+    def __enter__(self):
+        self.outerScope = getattr(_threadState, "scope", None)
+        _threadState.scope = self
+        return self
+
+    def __exit__(self, *excInfo):
+        _threadState.scope = self.outerScope
+
+    def stop(self):
+        """ Kill the programs of the scope that are running, and keep it from starting any more. """
+        with _runningState["lock"]:
+            self.stopped = True
+            _killRegisteredGroups(self)
+
+def _killRegisteredGroups(scope = None):
+    """ Kill the running programs in scope, or every running program if scope is None.
+    _runningState["lock"] must be held. """
+    for processGroup, groupScope in _runningState["groups"].items():
+        if scope is None or groupScope is scope:
+            try:
+                os.killpg(processGroup, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+
+def _checkCanStart():
+    """ Raise an error if no program may be started on the current thread now. """
+    if _runningState["stopping"]:
+        raise KeyboardInterrupt()
+    scope = getattr(_threadState, "scope", None)
+    if scope is not None and scope.stopped:
+        raise cpu_errors.RunCancelled("""The program was not run, as the programs it was run with were stopped.""")
+
+def _registerGroup(process):
+    """ Record that process, which leads its own process group, is running. It is killed right away if
+    it belongs to a stopped RunScope, or if running programs are being stopped. """
+    scope = getattr(_threadState, "scope", None)
+    with _runningState["lock"]:
+        _runningState["groups"][process.pid] = scope
+        stopping = _runningState["stopping"] or (scope is not None and scope.stopped)
+    if stopping:
+        _killGroup(process)
+
+def _reap(process):
+    """ Reap process, which has exited, and return its status and resource usage as given by os.wait4.
+    Its process group is forgotten first, as its pid may be reused once it is reaped. """
+    with _runningState["lock"]:
+        _runningState["groups"].pop(process.pid, None)
+    _, status, usage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    return status, usage
+
+def _setStopping(stopping):
+    """ Set whether running programs are being stopped. If they are, kill every running program. """
+    with _runningState["lock"]:
+        _runningState["stopping"] = stopping
+        if stopping:
+            _killRegisteredGroups()
+
+@contextmanager
+def interruptiblePool(pool):
+    """ Context manager for running programs from the threads of pool (a concurrent.futures.Executor),
+    which is shut down when it exits. KeyboardInterrupt only reaches the main thread, and shutting down
+    the pool waits for the programs its threads are running. So if the block raises, every running program
+    is killed first, and no new ones are started until the pool is shut down. """
+    try:
+        with pool:
+            try:
+                yield pool
+            except BaseException:
+                _setStopping(True)
+                raise
+    finally:
+        _setStopping(False)
+
+def _groupMembers(processGroup):
+    """ Return the pids of the processes in the given process group, or an empty list if they cannot
+    be listed (they are found in /proc, which only Linux has). """
+    members = []
+    try:
+        entries = os.listdir("/proc")
+    except FileNotFoundError:
+        return members
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "rb") as statFile:
+                stat = statFile.read()
+        except OSError:
+            continue
+        # The command name may hold spaces and parentheses, so the fields after it are counted from its end
+        fields = stat[stat.rindex(b")") + 2:].split()
+        if int(fields[2]) == processGroup:
+            members.append(int(entry))
+    return members
+
+# The number of processes programs left running after they exited, which cpu then killed
+_leftoverState = {"processes" : 0, "lock" : threading.Lock()}
+
+def _killLeftovers(processGroup, count = True):
+    """ Kill the processes still in processGroup after its leader exited and was reaped, and return
+    how many there were. If count is False, they are killed without being counted, and 0 is returned. """
+    try:
+        os.killpg(processGroup, 0 if count else signal.SIGKILL)
+    except ProcessLookupError:
+        return 0
+    if not count:
+        return 0
+    leftovers = max(1, len(_groupMembers(processGroup)))
+    try:
+        os.killpg(processGroup, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+    with _leftoverState["lock"]:
+        _leftoverState["processes"] += leftovers
+    return leftovers
+
+def leftoverProcessCount():
+    """ Return the number of processes that programs run by this process left running after
+    they exited. Such processes are killed once found. """
+    return _leftoverState["processes"]
+
+class _Supervision:
+    """ The supervision of a running process, apart from waiting for it, which is left to a driver
+    (_superviseProcessSync or _superviseProcess). fileInput is fed into the stdin of the process if given,
+    and its stdout is streamed into outputSink if it is piped. The process is killed after timeout seconds,
+    once it writes more than outputLimit bytes, or if supervising it fails. process must lead its own
+    process group; the whole group is killed with it, and processes left in the group once process exits
+    are killed too. It is also killed once its sampled peak memory goes over memoryLimit bytes.
+
+    The driver calls start with functions that watch and unwatch a file object, and calls the handler given
+    to watch whenever the file is ready. While the process runs, it calls poll every nextPoll() seconds.
+    Once the process has exited, it calls finish. If anything fails, it calls abort, and close in any case. """
+    def __init__(self, process, timeout, fileInput, outputSink, outputLimit, memoryLimit):
+        self.process = process
+        self.deadline = time.monotonic() + timeout if timeout is not None else None
+        self.source = getattr(fileInput, "buffer", fileInput)
+        self.outputSink = outputSink
+        self.outputLimit = outputLimit
+        self.memoryLimit = memoryLimit
+        self.pendingInput = b""
+        self.bytesRead = 0
+        self.timedOut = self.outputExceeded = self.memoryExceeded = False
+        # Whether the process group was killed by the supervision
+        self.killed = False
+        self.sampler = _MemorySampler(process.pid)
+        # The events each watched file object is watched for
+        self.watched = {}
+
+    def start(self, watch, unwatch):
+        """ Start feeding the input and reading the output. watch(fileObj, events, handler) and
+        unwatch(fileObj, events) are given by the driver; events are selectors events. """
+        self.watch, self.unwatch = watch, unwatch
+        if self.process.stdout is not None:
+            self.watchFile(self.process.stdout, selectors.EVENT_READ, self.readOutput)
+        if self.source is not None:
+            self.watchFile(self.process.stdin, selectors.EVENT_WRITE, self.feedInput)
+
+    def watchFile(self, fileObj, events, handler):
+        os.set_blocking(fileObj.fileno(), False)
+        self.watched[fileObj] = events
+        self.watch(fileObj, events, handler)
+
+    def closeFile(self, fileObj):
+        """ Stop watching fileObj if it is watched, and close it. """
+        if fileObj in self.watched:
+            self.unwatch(fileObj, self.watched.pop(fileObj))
+        fileObj.close()
+
+    def readOutput(self):
+        """ Copy what the process wrote into outputSink. """
+        try:
+            chunk = os.read(self.process.stdout.fileno(), OUTPUT_CHUNK_SIZE)
+        except BlockingIOError:
+            return
+        if not chunk:
+            self.closeFile(self.process.stdout)
+            return
+        self.bytesRead += len(chunk)
+        if self.outputLimit is not None and self.bytesRead > self.outputLimit:
+            self.outputExceeded = True
+            self.kill()
+            self.closeFile(self.process.stdout)
+            return
+        self.outputSink.write(chunk)
+
+    def feedInput(self):
+        """ Write the next part of the input into the stdin of the process. """
+        if not self.pendingInput:
+            self.pendingInput = self.source.read(OUTPUT_CHUNK_SIZE)
+            if not self.pendingInput:
+                self.closeFile(self.process.stdin)
+                return
+        try:
+            self.pendingInput = self.pendingInput[os.write(self.process.stdin.fileno(), self.pendingInput):]
+        except BlockingIOError:
+            pass
+        except BrokenPipeError:
+            # The process stopped reading, which is its own business
+            self.closeFile(self.process.stdin)
+
+    def nextPoll(self):
+        """ Return how many seconds the driver may wait before calling poll. """
+        if self.deadline is None or self.timedOut:
+            return POLL_INTERVAL
+        return min(POLL_INTERVAL, max(0, self.deadline - time.monotonic()))
+
+    def poll(self):
+        """ Sample the memory of the process, and kill it if it ran out of time or memory. """
+        self.sampler.sample()
+        if (self.memoryLimit is not None and not self.memoryExceeded and self.sampler.peak is not None
+                and self.sampler.peak > self.memoryLimit):
+            self.memoryExceeded = True
+            self.kill()
+        if self.deadline is not None and not self.timedOut and time.monotonic() >= self.deadline:
+            self.timedOut = True
+            self.kill()
+
+    def kill(self):
+        """ Kill the process group. """
+        self.killed = True
+        _killGroup(self.process)
+
+    def finish(self):
+        """ Reap the process, which has exited, and finish reading its output. Return a (status, usage,
+        peakMemory, timedOut, outputExceeded, memoryExceeded, leftovers) tuple, where status and usage are
+        given by os.wait4, peakMemory by _MemorySampler, and leftovers is the number of processes left in the
+        group after the process exited on its own. """
+        # Until the process is reaped, its pid (which is also its group's) cannot be reused
+        status, usage = _reap(self.process)
+        peakMemory = self.sampler.peakMemory(usage)
+        # Processes in a group that was killed (by the supervision, a RunScope, or the CPU limit) may not
+        # have exited yet, but were not left over by the process
+        killed = self.killed or (os.WIFSIGNALED(status) and os.WTERMSIG(status) in (signal.SIGKILL, signal.SIGXCPU))
+        # Leftover processes may hold the output pipe open, so they are killed before the output is finished
+        leftovers = _killLeftovers(self.process.pid, count = not killed)
+        if self.source is not None and not self.process.stdin.closed:
+            self.closeFile(self.process.stdin)
+        stdout = self.process.stdout
+        if stdout is not None and not stdout.closed:
+            if stdout in self.watched:
+                self.unwatch(stdout, self.watched.pop(stdout))
+            os.set_blocking(stdout.fileno(), True)
+            while not stdout.closed:
+                self.readOutput()
+        return status, usage, peakMemory, self.timedOut, self.outputExceeded, self.memoryExceeded, leftovers
+
+    def abort(self):
+        """ Kill and reap the process, unless it was reaped already. """
+        if self.process.returncode is None:
+            _killGroup(self.process)
+            _reap(self.process)
+
+    def close(self):
+        """ Close the pipes of the process and outputSink. """
+        for fileObj in [self.process.stdin if self.source is not None else None, self.process.stdout]:
+            if fileObj is not None and not fileObj.closed:
+                self.closeFile(fileObj)
+        if self.process.stdout is not None:
+            self.outputSink.close()
+
+async def _superviseProcess(process, timeout, fileInput = None, outputSink = None, outputLimit = None, memoryLimit = None):
+    """ Supervise process (see _Supervision) on the running event loop, so several processes can be
+    supervised at once, and return what _Supervision.finish returns. Cancelling this kills the process. """
+    loop = asyncio.get_running_loop()
+    supervision = _Supervision(process, timeout, fileInput, outputSink, outputLimit, memoryLimit)
+    errors = []
+    def guarded(handler):
+        # An error in a callback would only reach the loop, so the process is killed, and the error is
+        # raised once it has exited
+        def callHandler():
+            try:
+                handler()
+            except Exception as e:
+                errors.append(e)
+                supervision.kill()
+        return callHandler
+    def watch(fileObj, events, handler):
+        addWatch = loop.add_reader if events == selectors.EVENT_READ else loop.add_writer
+        addWatch(fileObj.fileno(), guarded(handler))
+    def unwatch(fileObj, events):
+        removeWatch = loop.remove_reader if events == selectors.EVENT_READ else loop.remove_writer
+        removeWatch(fileObj.fileno())
+    def poll():
+        nonlocal pollTimer
+        guarded(supervision.poll)()
+        pollTimer = loop.call_later(supervision.nextPoll(), poll)
+    pollTimer = None
+    try:
+        supervision.start(watch, unwatch)
+        pollTimer = loop.call_later(supervision.nextPoll(), poll)
+        await _waitForExit(process)
+        pollTimer.cancel()
+        if errors:
+            raise errors[0]
+        return supervision.finish()
+    except BaseException:
+        supervision.abort()
+        raise
+    finally:
+        if pollTimer is not None:
+            pollTimer.cancel()
+        supervision.close()
+
+def _superviseProcessSync(process, timeout, fileInput = None, outputSink = None, outputLimit = None, memoryLimit = None):
+    """ Supervise process (see _Supervision), blocking the current thread, which is cheaper than an
+    event loop when a single process is run. Return what _Supervision.finish returns. """
+    supervision = _Supervision(process, timeout, fileInput, outputSink, outputLimit, memoryLimit)
+    selector = selectors.DefaultSelector()
+    try:
+        pidfd = os.pidfd_open(process.pid)
+    except (AttributeError, OSError):
+        # Without pidfds (e.g. on macOS), the process is polled instead
+        pidfd = None
+    try:
+        supervision.start(lambda fileObj, events, handler: selector.register(fileObj, events, handler),
+                          lambda fileObj, events: selector.unregister(fileObj))
+        if pidfd is not None:
+            selector.register(pidfd, selectors.EVENT_READ, None)
+        exited = False
+        while not exited:
+            for key, _ in selector.select(supervision.nextPoll()):
+                if key.data is None:
+                    exited = True
+                else:
+                    key.data()
+            if pidfd is None:
+                exited = os.waitid(os.P_PID, process.pid, os.WEXITED | os.WNOHANG | os.WNOWAIT) is not None
+            if not exited:
+                supervision.poll()
+        return supervision.finish()
+    except BaseException:
+        supervision.abort()
+        raise
+    finally:
+        supervision.close()
+        selector.close()
+        if pidfd is not None:
+            os.close(pidfd)
 
 class Executable:
     """ An executable is something cpu can run. Each executable is composed of:
@@ -35,7 +552,7 @@ class Executable:
         commandsAvailable = cfg[self.ext]["compile"]
         if commandKey not in commandsAvailable:
             raise cpu_errors.UnknownCompilationCommand(f"""cpu does not recognize the
-compilation command {compileCommand} used. Make sure the corresponding key exists in the config file.""")
+compilation command {commandKey} used. Make sure the corresponding key exists in the config file.""")
         return commandsAvailable[commandKey]
 
     def getRunCommand(self):
@@ -47,9 +564,23 @@ compilation command {compileCommand} used. Make sure the corresponding key exist
 {self.src}. Check that a key corresponding to the file extension exists in ~/.cpu/.config.""")
         return cfg[self.ext]["run"]
 
+    def getExpandedRunCommand(self):
+        """ Return the command that runs the executable, as a list, with its template parameters filled in.
+        .compile() must have been called on the executable. """
+        if self.exec_loc is None:
+            raise cpu_errors.UncompiledRunAttempted(f"""The program {self.name} has not been compiled yet. """)
+        @utilities.mapOverInputList
+        def expandTemplate(s):
+            return s.format(name = self.name, file = os.path.abspath(os.path.expanduser(self.exec_loc)))
+        # exec_loc may be relative, so the expanded command depends on the current directory
+        return configuration.derivedValue(("run", self.ext, self.name, self.exec_loc, os.getcwd()),
+                                          lambda: expandTemplate(self.getRunCommand()))
+
+    @tracing.traced("compile", lambda self, *args, **kwargs: {"program" : self.name})
     def compile(self, commandKey = None, outputDirectory = ""):
         """ Run the compilation command stored in the config file, and store the output in outputDirectory.
-        Use the given commandKey if given."""
+        Use the given commandKey if given. If the same source was already compiled with the same command,
+        the compiler is skipped and the program is taken from the compile cache."""
         currentWorkingDir = os.getcwd()
         with utilities.cd(outputDirectory):
             @utilities.mapOverInputList
@@ -57,43 +588,116 @@ compilation command {compileCommand} used. Make sure the corresponding key exist
                 return s.format(name = self.name, file = os.path.join(os.path.relpath(currentWorkingDir), self.src))
             # run the compilation command
             try:
-                commandString, compilationOutput = map(expandTemplate, self.getCompileCommand())
-                compileComplete = subprocess.run(commandString)
-                if compileComplete.returncode != 0:
-                    raise cpu_errors.UnsuccessfulCompilation(f"""Compilation return code is {compileComplete.returncode}""")
+                commandString, compilationOutput = map(expandTemplate, self.getCompileCommand(commandKey))
+                cacheKey = compile_cache.cacheKey(os.path.join(currentWorkingDir, self.src), commandString)
+                if not compile_cache.fetch(cacheKey, compilationOutput[0]):
+                    compileComplete = subprocess.run(commandString)
+                    if compileComplete.returncode != 0:
+                        raise cpu_errors.UnsuccessfulCompilation(f"""Compilation return code is {compileComplete.returncode}""")
+                    compile_cache.store(cacheKey, compilationOutput[0])
                 self.exec_loc = os.path.join(outputDirectory, compilationOutput[0])
             except KeyError as e:
                 raise cpu_errors.ImproperCompilationCommand(f"""cpu does not recognize the
     shortcut {e}. Make sure it is properly spelled.""")
 
-    def run(self, cmdArgs = [], fileInput = None, fileToWrite = subprocess.PIPE, timeout = None, pipeToTerminal = False):
+    def run(self, cmdArgs = [], fileInput = None, fileToWrite = subprocess.PIPE, timeout = None, pipeToTerminal = False,
+            memoryLimit = None, cpuLimit = None, outputSink = None, outputLimit = None, cpuAffinity = None):
+        """ Run the executable and wait for it to finish, blocking the current thread. This takes the same
+        arguments as run_async, except semaphore, and returns the same RunResult. """
+        with tracing.span("run", program = self.name) as runSpan:
+            timeStarted = time.monotonic()
+            process, inputToFeed, outputSink, outputBuffer = self._startProcess(cmdArgs, fileInput, fileToWrite, pipeToTerminal,
+                                                                                memoryLimit, cpuLimit, outputSink, outputLimit, cpuAffinity)
+            supervision = _superviseProcessSync(process, timeout, inputToFeed, outputSink, outputLimit, memoryLimit)
+            return self._finishRun(runSpan, timeStarted, supervision, outputBuffer, timeout, memoryLimit, cpuLimit, outputLimit)
+
+    async def run_async(self, cmdArgs = [], fileInput = None, fileToWrite = subprocess.PIPE, timeout = None,
+                        pipeToTerminal = False, memoryLimit = None, cpuLimit = None, outputSink = None, outputLimit = None,
+                        cpuAffinity = None, semaphore = None):
         """ Run the executable using the command stored in the config file. .compile() must have been called on the
         executable. If fileToWrite is supplied, and it is a binary file-like object, pipe stdout to the given file.
         cmdArgs is a list that is appended to the run command. If fileInput is given, and it is a binary file-like
         object, pipe the file to stdin. If pipeToTerminal is true, send both stdin and stdout to the terminal.
 
-        Return a list with two elements. The first is the output of the executable if output is not piped anywhere,
-        or None if it is. The second is the time in seconds the execution took, which is computed using time.time()
+        timeout limits the wall time of the execution in seconds. cpuLimit limits its CPU time in seconds, and
+        memoryLimit limits its peak resident memory in bytes (see _MemorySampler): the executable is killed once
+        its sampled peak goes over it. cpuLimit is also enforced with setrlimit in the child, and so is memoryLimit
+        where memory cannot be sampled.
+        If cpuAffinity is given, the executable only runs on the CPUs in it, which makes its timing less noisy.
+
+        If outputSink is given, stdout is streamed into it (see the streams module) instead of fileToWrite.
+        If outputLimit is given, the executable is stopped once it writes more than outputLimit bytes.
+
+        If semaphore (an asyncio.Semaphore) is given, it is held while the executable runs, which limits the
+        number of executables running at once. Cancelling this stops the executable.
+
+        Return a RunResult. Its output is the output of the executable if output is not piped anywhere,
+        or None if it is.
         """
-        if self.exec_loc is None:
-            raise cpu_errors.UncompiledRunAttempted(f"""The program {self.name} has not been compiled yet. """)
-        @utilities.mapOverInputList
-        def expandTemplate(s):
-            return s.format(name = self.name, file = os.path.abspath(os.path.expanduser(self.exec_loc)))
-        exec_cmd = expandTemplate(self.getRunCommand())
-        returnValue = [None, None]
-        try:
-            timeStarted = time.time()
-            runComplete = subprocess.run(exec_cmd + cmdArgs, check = True,
-                                         stdin = fileInput, stdout = None if pipeToTerminal else fileToWrite, timeout = timeout)
-            returnValue[1] = time.time() - timeStarted
-        except subprocess.TimeoutExpired as e:
-            raise cpu_errors.SolutionTimeout(f"""Your code could not finish in {e.timeout} seconds.""")
-        except subprocess.CalledProcessError as e:
-            raise cpu_errors.SolutionExecution(f"""Your code exited with return code {e.returncode}.""")
-        if fileToWrite == subprocess.PIPE and not pipeToTerminal:
-            returnValue[0] = runComplete.stdout.decode('utf-8')
-        return returnValue
+        if semaphore is not None:
+            async with semaphore:
+                # Subclasses wrap this method, and have done so already
+                return await Executable.run_async(self, cmdArgs, fileInput, fileToWrite, timeout, pipeToTerminal, memoryLimit,
+                                                  cpuLimit, outputSink, outputLimit, cpuAffinity)
+        with tracing.span("run", program = self.name) as runSpan:
+            timeStarted = time.monotonic()
+            process, inputToFeed, outputSink, outputBuffer = self._startProcess(cmdArgs, fileInput, fileToWrite, pipeToTerminal,
+                                                                                memoryLimit, cpuLimit, outputSink, outputLimit, cpuAffinity)
+            supervision = await _superviseProcess(process, timeout, inputToFeed, outputSink, outputLimit, memoryLimit)
+            return self._finishRun(runSpan, timeStarted, supervision, outputBuffer, timeout, memoryLimit, cpuLimit, outputLimit)
+
+    def _startProcess(self, cmdArgs, fileInput, fileToWrite, pipeToTerminal, memoryLimit, cpuLimit, outputSink, outputLimit,
+                      cpuAffinity):
+        """ Start the executable for run or run_async, which take the same arguments. Return the process,
+        the input that has to be fed into its stdin (or None), the sink its stdout has to be streamed into
+        (or None), and the buffer that collects its output if it is returned (or None). """
+        exec_cmd = self.getExpandedRunCommand()
+        stdout = None if pipeToTerminal else fileToWrite
+        outputBuffer = None
+        if not pipeToTerminal:
+            if outputSink is None and fileToWrite == subprocess.PIPE:
+                outputSink = outputBuffer = streams.BufferSink()
+            elif outputSink is None and outputLimit is not None:
+                # The output has to pass through cpu to be counted
+                outputSink = streams.FileSink(fileToWrite)
+            if outputSink is not None:
+                stdout = subprocess.PIPE
+        # Inputs without a file descriptor (e.g. compressed tests) are fed through a pipe
+        feedInput = not _isPlainFile(fileInput)
+        _checkCanStart()
+        # The process is started with Popen rather than asyncio, whose child watchers reap processes
+        # with waitpid and lose their resource usage
+        # In a new session, the executable and everything it starts can be killed together. This
+        # also keeps Ctrl-C from the terminal away from it; cpu stops it instead
+        process = subprocess.Popen(exec_cmd + cmdArgs, stdin = subprocess.PIPE if feedInput else fileInput, stdout = stdout,
+                                   preexec_fn = _resourceLimiter(memoryLimit, cpuLimit, cpuAffinity),
+                                   start_new_session = True)
+        _registerGroup(process)
+        return process, fileInput if feedInput else None, outputSink, outputBuffer
+
+    def _finishRun(self, runSpan, timeStarted, supervision, outputBuffer, timeout, memoryLimit, cpuLimit, outputLimit):
+        """ Return the RunResult of a run of the executable, given what supervising it returned, or raise
+        the error it ran into. """
+        status, usage, peakMemory, timedOut, outputExceeded, memoryExceeded, leftovers = supervision
+        if runSpan is not None and leftovers:
+            runSpan["args"]["leftover_processes"] = leftovers
+        runResult = RunResult(None, time.monotonic() - timeStarted, usage.ru_utime + usage.ru_stime, peakMemory)
+        returnCode = os.waitstatus_to_exitcode(status)
+        if timedOut:
+            raise cpu_errors.SolutionTimeout(f"""Your code could not finish in {timeout} seconds.""")
+        if outputExceeded:
+            raise cpu_errors.SolutionOutputLimit(f"""Your code printed more than {utilities.humanizeFileSize(outputLimit)} of output.""")
+        # Killing a program over the memory limit looks like running out of CPU time below
+        if memoryExceeded or (memoryLimit is not None and peakMemory is not None and peakMemory > memoryLimit):
+            raise cpu_errors.SolutionMemoryLimit(f"""Your code used {utilities.humanizeFileSize(runResult.peakMemory)} of memory,
+exceeding the limit of {utilities.humanizeFileSize(memoryLimit)}.""")
+        if cpuLimit is not None and (runResult.cpuTime > cpuLimit or -returnCode in (signal.SIGXCPU, signal.SIGKILL)):
+            raise cpu_errors.SolutionTimeout(f"""Your code used more than {cpuLimit} seconds of CPU time.""")
+        if returnCode != 0:
+            raise cpu_errors.SolutionExecution(f"""Your code exited with return code {returnCode}.""")
+        if outputBuffer is not None:
+            runResult.output = outputBuffer.getvalue().decode('utf-8')
+        return runResult
 
     def deleteExecutable(self):
         """ Deletes the file pointed to in exec_loc. """
@@ -1,6 +1,8 @@
-from compprogutils import manifests, cpu_errors, utilities
+from compprogutils import manifests, cpu_errors, utilities, tests, executables
 
 import os
+# For running generators in parallel
+import concurrent.futures
 
 def getGen(name):
     """ Fetches the generator with the given name from the manifest,
@@ -22,3 +24,26 @@ def fetchInputUntilEOF():
         pass
     return ''.join(s + '\n' for s in lines)
 
+
+def generateInput(genExec, testPackage, genArgs = [], timeout = None):
+    """ Run genExec with the arguments genArgs, and write its output to the input file of testPackage.
+    Return the CPUException raised by the run, or None if it succeeded. If the run fails, the
+    files of testPackage are deleted. """
+    try:
+        with testPackage.getFileObject(tests.TestFile.INPUT, "wb") as inputFile:
+            genExec.run(cmdArgs = genArgs, fileToWrite = inputFile, timeout = timeout)
+        return None
+    except cpu_errors.CPUException as ce:
+        testPackage.deleteFiles()
+        return ce
+
+def generateInputs(genExec, newTests, seedFrom = 1, jobs = 1, timeout = None):
+    """ Generate the input of each test in the list newTests with generateInput. The k-th test
+    (counting from 0) passes seedFrom + k to the generator as its only argument. Up to jobs
+    generators run at the same time, and are stopped if this is interrupted. Return the list of results
+    of generateInput, in order. """
+    def generateNth(indexedTest):
+        index, testPackage = indexedTest
+        return generateInput(genExec, testPackage, [str(seedFrom + index)], timeout)
+    with executables.interruptiblePool(concurrent.futures.ThreadPoolExecutor(max_workers = max(jobs, 1))) as pool:
+        return list(pool.map(generateNth, enumerate(newTests)))
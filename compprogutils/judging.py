@@ -0,0 +1,223 @@
+""" Module for judging solutions against tests, and for generating the outputs of tests. """
+
+# For the worker pool
+import concurrent.futures, queue
+import os, shutil, tempfile
+
+from compprogutils import cpu_errors, tests, utilities, streams, checkers, tracing, timing, executables
+
+class TestVerdict:
+    """ Object that holds the result of judging a single test. Has the following members:
+        - testName, the name of the judged test,
+        - score, the score given by the checker (0 if the solution failed to run), or None if
+          the test was skipped,
+        - notes, the remarks of the checker, or the error message of a failed run,
+        - timeElapsed, cpuTime and peakMemory, the wall time, CPU time and peak memory
+          the solution used, if it finished,
+        - error, a short verdict string (e.g. TLE, MLE, OLE, RTE) if the solution failed to run,
+        - outputPreview, a list of lines containing the start of the solution's output,
+        - cached, True iff the verdict was taken from the verdict cache instead of judging the test,
+        - timing, the summary (see timing.TimingSamples.summary) of repeated runs, if the test was timed. """
+    def __init__(self, testName, score = None, notes = "", timeElapsed = None, error = None, outputPreview = None,
+                 cpuTime = None, peakMemory = None, cached = False, timing = None):
+        self.testName = testName
+        self.score = score
+        self.notes = notes
+        self.timeElapsed = timeElapsed
+        self.cpuTime = cpuTime
+        self.peakMemory = peakMemory
+        self.error = error
+        self.outputPreview = outputPreview
+        self.cached = cached
+        self.timing = timing
+
+    @property
+    def skipped(self):
+        return self.score is None
+
+    @property
+    def verdictName(self):
+        """ The short name of the verdict: SKIP for skipped tests, the error for failed runs,
+        and the checker's verdict (AC, WA, ...) otherwise. """
+        if self.skipped:
+            return "SKIP"
+        if self.error is not None:
+            return self.error
+        return checkers.getVerdictName(self.score)
+
+    def __serialize__(self):
+        """ Return a JSON-serializable dict which decodes to an equivalent verdict. """
+        return {"test_name" : self.testName, "score" : self.score, "notes" : self.notes,
+                "time_elapsed" : self.timeElapsed, "cpu_time" : self.cpuTime, "peak_memory" : self.peakMemory,
+                "error" : self.error, "output_preview" : self.outputPreview, "timing" : self.timing}
+
+    @classmethod
+    def __deserialize__(cls, obj, cached = False):
+        return cls(obj["test_name"], obj["score"], obj["notes"], obj["time_elapsed"], obj["error"],
+                   obj["output_preview"], obj["cpu_time"], obj["peak_memory"], cached = cached, timing = obj.get("timing"))
+
+    def __repr__(self):
+        return f"TestVerdict({self.testName}, score = {self.score}, error = {self.error}, timeElapsed = {self.timeElapsed})"
+
+@tracing.traced("judgeTest", lambda solExec, checkerExec, testName, *args, **kwargs: {"test" : testName})
+def judgeTest(solExec, checkerExec, testName, testPackage, outputCheckName, previewLines = 5, repeat = 1, warmup = 0,
+              **runOptions):
+    """ Run solExec on testPackage, writing its output to outputCheckName, then check that output with
+    checkerExec. runOptions (timeout, memoryLimit, cpuLimit, outputLimit, cpuAffinity) are passed to solExec.run.
+    If repeat is more than 1 and the run succeeds, also time repeat more runs after warmup runs (see timing.measure).
+    Return a TestVerdict. """
+    if not testPackage.checkFileExists(tests.TestFile.OUTPUT):
+        return TestVerdict(testName)
+    with open(outputCheckName, "w") as outputToCheck:
+        with testPackage.getFileObject(tests.TestFile.INPUT, "r") as testInput:
+            try:
+                solutionRunData = solExec.run(fileInput = testInput, fileToWrite = outputToCheck, **runOptions)
+            except cpu_errors.SolutionTimeout as ce:
+                return TestVerdict(testName, 0, ce.message, error = "TLE")
+            except cpu_errors.SolutionMemoryLimit as ce:
+                return TestVerdict(testName, 0, ce.message, error = "MLE")
+            except cpu_errors.SolutionOutputLimit as ce:
+                return TestVerdict(testName, 0, ce.message, error = "OLE")
+            except cpu_errors.MalformedDataDelimiter as ce:
+                return TestVerdict(testName, 0, ce.message, error = "RTE")
+            except cpu_errors.SolutionExecution as ce:
+                return TestVerdict(testName, 0, ce.message, error = "RTE")
+    outputPreview = utilities.wrapFileContentsList(outputCheckName, shutil.get_terminal_size().columns - 5, previewLines)
+    score, notes = checkerExec.checkOutputFile(testPackage, outputCheckName)
+    timingSummary = None
+    if repeat > 1:
+        try:
+            timingSummary = timing.measure(solExec, testPackage, repeat, warmup, **runOptions).summary()
+        except cpu_errors.CPUException:
+            # The solution only failed on a timing run, so its times would be misleading
+            pass
+    return TestVerdict(testName, score, notes, solutionRunData.timeElapsed, outputPreview = outputPreview,
+                       cpuTime = solutionRunData.cpuTime, peakMemory = solutionRunData.peakMemory, timing = timingSummary)
+
+def judgeTests(solExec, checkerExec, testsToRun, outputPrefix, jobs = 1, **runOptions):
+    """ Judge every test in the dict testsToRun. Output files are named by appending a suffix to
+    outputPrefix. If jobs is greater than 1, up to jobs tests are judged at the same time, each
+    writing to its own output file, which is removed once judging finishes. runOptions are passed to judgeTest.
+
+    Return an iterator of TestVerdicts, in the same order as testsToRun. """
+    if jobs <= 1:
+        outputCheckName = f"{outputPrefix}.txt"
+        return (judgeTest(solExec, checkerExec, testName, testPackage, outputCheckName, **runOptions)
+                for testName, testPackage in testsToRun.items())
+    # Each worker borrows an output file from this pool, so no two running tests share one
+    slotNames = [f"{outputPrefix}_{slot}.txt" for slot in range(jobs)]
+    outputSlots = queue.SimpleQueue()
+    for slotName in slotNames:
+        outputSlots.put(slotName)
+    def judgeWithSlot(testItem):
+        outputCheckName = outputSlots.get()
+        try:
+            return judgeTest(solExec, checkerExec, *testItem, outputCheckName, **runOptions)
+        finally:
+            outputSlots.put(outputCheckName)
+    def judgeAll():
+        try:
+            yield from _mapInPool(judgeWithSlot, testsToRun.items(), jobs)
+        finally:
+            # The pool has been shut down, so no test is writing to the files
+            for slotName in slotNames:
+                if os.path.isfile(slotName):
+                    os.remove(slotName)
+    return judgeAll()
+
+def judgeTestsIncrementally(solExec, checkerExec, testsToRun, outputPrefix, verdictCache, reuse = True,
+                            jobs = 1, **runOptions):
+    """ Like judgeTests, but record the verdicts in verdictCache (a verdict_cache.VerdictCache).
+    If reuse is True, tests whose verdict is cached under an unchanged key are not judged again;
+    their cached verdicts are returned instead, with the cached flag set. """
+    keys = {testName: verdictCache.verdictKey(solExec, checkerExec, testPackage, runOptions)
+            for testName, testPackage in testsToRun.items()}
+    cachedVerdicts = {}
+    if reuse:
+        for testName, key in keys.items():
+            cachedVerdict = verdictCache.getVerdict(solExec.name, testName, key)
+            if cachedVerdict is not None:
+                cachedVerdicts[testName] = TestVerdict.__deserialize__(cachedVerdict, cached = True)
+    staleTests = {testName: testPackage for testName, testPackage in testsToRun.items()
+                  if testName not in cachedVerdicts}
+    freshVerdicts = judgeTests(solExec, checkerExec, staleTests, outputPrefix, jobs, **runOptions)
+    for testName in testsToRun:
+        if testName in cachedVerdicts:
+            yield cachedVerdicts[testName]
+            continue
+        verdict = next(freshVerdicts)
+        if not verdict.skipped:
+            verdictCache.putVerdict(solExec.name, testName, keys[testName], verdict.__serialize__())
+        yield verdict
+
+async def makeOutput(solExec, testName, testPackage, **runOptions):
+    """ Run solExec on testPackage, and make its output and data the test's output and data files.
+    The files are first written under temporary names, and only replace the old files once the
+    solution finishes, so a failed or interrupted run leaves the old files in place. runOptions
+    are passed to solExec.run_async.
+
+    Return a (testName, timeElapsed, error) tuple. error is the CPUException raised by the run,
+    or None if it succeeded, in which case timeElapsed is its wall time in seconds. """
+    outputName = testPackage.getFilename(tests.TestFile.OUTPUT)
+    dataName = testPackage.getFilename(tests.TestFile.DATA)
+    fd, tempOutputName = tempfile.mkstemp(dir = os.path.dirname(outputName) or ".", prefix = ".tmp")
+    tempDataName = f"{tempOutputName}.data"
+    try:
+        with os.fdopen(fd, "wb") as outputFile:
+            with testPackage.getFileObject(tests.TestFile.INPUT, "rb") as inputFile:
+                runResult = await solExec.run_async(fileInput = inputFile, fileToWrite = outputFile,
+                                                    dataSink = streams.LazyFileSink(tempDataName), **runOptions)
+        # Data written by the solution replaces any old data, and data written by hand is kept if it
+        # wrote none. The old files are deleted first, as they may be stored compressed under another name
+        if os.path.isfile(tempDataName):
+            testPackage.deleteFiles(tests.TestFile.DATA)
+            os.replace(tempDataName, dataName)
+        testPackage.deleteFiles(tests.TestFile.OUTPUT)
+        os.replace(tempOutputName, outputName)
+        return (testName, runResult.timeElapsed, None)
+    except cpu_errors.CPUException as ce:
+        return (testName, None, ce)
+    finally:
+        for tempName in [tempOutputName, tempDataName]:
+            if os.path.isfile(tempName):
+                os.remove(tempName)
+
+def makeOutputs(solExec, testsToGenerate, jobs = 1, **runOptions):
+    """ Generate the outputs of every test in the dict testsToGenerate with makeOutput. If jobs is
+    greater than 1, up to jobs tests are run at the same time, on a single thread. Return an iterator
+    of the results of makeOutput, in the same order as testsToGenerate. """
+    return executables.iterateConcurrently((makeOutput(solExec, testName, testPackage, **runOptions)
+                                            for testName, testPackage in testsToGenerate.items()), jobs)
+
+def judgeProblemTest(problemTest):
+    """ Judge a test of a problem of the contest. problemTest is a (problemDirectory, solExec, checkerExec,
+    testName, testPackage, runOptions) tuple, where problemDirectory is the problem's folder, solExec and
+    checkerExec are compiled, and runOptions are passed to judgeTest. Return a TestVerdict.
+
+    This changes into problemDirectory, so it is meant to be run in a worker process. """
+    problemDirectory, solExec, checkerExec, testName, testPackage, runOptions = problemTest
+    os.chdir(problemDirectory)
+    # A worker judges one test at a time, so its output file is its own
+    outputCheckName = os.path.join("outputs", f"{solExec.name}_out_{os.getpid()}.txt")
+    try:
+        return judgeTest(solExec, checkerExec, testName, testPackage, outputCheckName, **runOptions)
+    finally:
+        if os.path.isfile(outputCheckName):
+            os.remove(outputCheckName)
+
+def judgeContestTests(problemTests, jobs = 1):
+    """ Judge every test in the list problemTests (see judgeProblemTest) on a single pool of jobs worker
+    processes, shared by all the problems. Return an iterator of TestVerdicts, in the same order as problemTests. """
+    return _mapInPool(judgeProblemTest, problemTests, jobs, concurrent.futures.ProcessPoolExecutor)
+
+def _mapInPool(func, items, jobs, executorClass = concurrent.futures.ThreadPoolExecutor):
+    """ Like map, but runs func on a pool of jobs workers, threads unless another executorClass is given.
+    Results are yielded in order. The pool is shut down once every result has been yielded, and the
+    programs its workers run are killed if this is interrupted. """
+    with executables.interruptiblePool(executorClass(max_workers = jobs)) as pool:
+        yield from pool.map(func, items)
+
+def minimumScore(verdicts):
+    """ Return the minimum score among verdicts, ignoring skipped tests. This is 1 if
+    no test was judged. """
+    return min((verdict.score for verdict in verdicts if not verdict.skipped), default = 1)
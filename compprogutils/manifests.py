@@ -9,9 +9,12 @@
 # A problem manifest contains five keys: (solutions, checkers, data-makers, generators, tests)
 # Each of these keys is an array of Executable objects (in the tests key, it is made of Test objects)
 
-import json, os
+import json, os, copy
 
-from compprogutils import executables, tests, solutions, checkers, cpu_errors, configuration
+from compprogutils import executables, tests, solutions, checkers, cpu_errors, configuration, utilities, tracing
+
+# Only needed for writing manifests
+tempfile = utilities.lazyImport("tempfile")
 
 from contextlib import contextmanager
 
@@ -34,7 +37,7 @@ def requireManifest(mtype):
 you are in a cpu directory. Look for the .cpu.{mtype}_manifest file.""")
 
 CUSTOM_CLASSES = [executables.Executable, tests.Test, executables.NonLocalExecutable, solutions.Solution,
-                  checkers.Checker]
+                  checkers.Checker, checkers.TokenChecker]
 TYPE_NAMES = {cls.__name__: cls for cls in CUSTOM_CLASSES}
 
 class ManifestEncoder(json.JSONEncoder):
@@ -60,38 +63,128 @@ class ManifestDecoder(json.JSONDecoder):
 
 EMPTY_MANIFEST = {}
 
+# Decoded manifests, keyed by absolute file name. Each value is a (stamp, text, manifest) tuple, where stamp
+# identifies the version of the file that was read, and text is its contents.
+_manifestCache = {}
+# Merged problem and global manifests, keyed by the problem manifest's absolute file name. The value is a (stamps, manifest) tuple.
+_mergedCache = {}
+
+# The umask is needed to give new manifest files the usual permissions
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+def _fileStamp(fileName):
+    """ Return a value that changes whenever the file with the given name is modified. """
+    fileStat = os.stat(fileName)
+    return (fileStat.st_mtime_ns, fileStat.st_size, fileStat.st_ino)
+
+def _copyManifest(m):
+    """ Return a copy of m that can be modified without affecting m. Its top-level dicts are copied,
+    along with the executables and tests in them, which are modified by commands that only read the
+    manifest (e.g. by compiling an executable). """
+    return {key: {name: copy.copy(value) for name, value in value.items()} if isinstance(value, dict) else value
+            for key, value in m.items()}
+
+def _isModified(m, original):
+    """ Return True if m may differ from original, the manifest it was copied from with _copyManifest.
+    This is much cheaper than encoding m: the executables and tests in it are compared by their
+    attributes, which only hold plain values. """
+    if m.keys() != original.keys():
+        return True
+    for key, value in m.items():
+        originalValue = original[key]
+        if not (isinstance(value, dict) and isinstance(originalValue, dict)):
+            if value != originalValue:
+                return True
+            continue
+        if value.keys() != originalValue.keys():
+            return True
+        for name, obj in value.items():
+            originalObj = originalValue[name]
+            if obj is originalObj:
+                continue
+            if type(obj) is not type(originalObj) or getattr(obj, "__dict__", obj) != getattr(originalObj, "__dict__", originalObj):
+                return True
+    return False
+
+def _readManifest(fileName):
+    """ Return the cached (stamp, text, manifest) entry for fileName, reading the file again
+    if it changed since it was last read. The manifest must not be modified. """
+    stamp = _fileStamp(fileName)
+    cacheKey = os.path.abspath(fileName)
+    cached = _manifestCache.get(cacheKey)
+    if cached is not None and cached[0] == stamp:
+        return cached
+    with tracing.span("readManifest", file = fileName):
+        with open(fileName, "r") as f:
+            text = f.read()
+        cached = (stamp, text, json.loads(text, cls=ManifestDecoder))
+    _manifestCache[cacheKey] = cached
+    return cached
+
 def loadManifestFrom(fileName):
     """ Retrieve the encoded manifest from the file with the given filename. """
-    with open(fileName, "r") as f:
-        return json.load(f, cls=ManifestDecoder)
+    return _copyManifest(_readManifest(fileName)[2])
 
 def saveManifestTo(m, fileName):
-    """ Save the given manifest to a file with the given filename. """
-    with open(fileName, "w") as f:
-        return json.dump(m, f, cls=ManifestEncoder, indent=2)
+    """ Save the given manifest to a file with the given filename. The file is only written
+    if its contents change, and it is replaced atomically, so it is never left half-written. """
+    text = json.dumps(m, cls=ManifestEncoder, indent=2)
+    cacheKey = os.path.abspath(fileName)
+    cached = _manifestCache.get(cacheKey)
+    if cached is not None and cached[1] == text and os.path.isfile(fileName) and cached[0] == _fileStamp(fileName):
+        return
+    try:
+        mode = os.stat(fileName).st_mode & 0o777
+    except FileNotFoundError:
+        mode = 0o666 & ~_UMASK
+    with tracing.span("writeManifest", file = fileName):
+        fd, tempName = tempfile.mkstemp(dir = os.path.dirname(fileName) or ".", prefix = ".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(text)
+            os.chmod(tempName, mode)
+            os.replace(tempName, fileName)
+        except BaseException:
+            os.remove(tempName)
+            raise
+    _manifestCache[cacheKey] = (_fileStamp(fileName), text, _copyManifest(m))
 
 def loadManifestType(mtype):
     """ Retrieve the manifest with the given type. If it is of the `problem` type,
     include the information in the global_manifest."""
     requireManifest(mtype)
-    mret = loadManifestFrom(f".cpu.{mtype}_manifest.json")
-    if mtype == "problem":
-        globalManifest = loadManifestFrom(configuration.configFilePath("global_manifest.json"))
-        for localKey in mret:
-            if localKey not in globalManifest:
+    fileName = f".cpu.{mtype}_manifest.json"
+    if mtype != "problem":
+        return loadManifestFrom(fileName)
+    globalFileName = configuration.configFilePath("global_manifest.json")
+    localStamp, _, localManifest = _readManifest(fileName)
+    globalStamp, _, globalManifest = _readManifest(globalFileName)
+    cacheKey = os.path.abspath(fileName)
+    cached = _mergedCache.get(cacheKey)
+    if cached is not None and cached[0] == (localStamp, globalStamp):
+        return _copyManifest(cached[1])
+    mret = _copyManifest(localManifest)
+    for localKey in mret:
+        if localKey not in globalManifest:
+            continue
+        for globalInKey in globalManifest[localKey]:
+            if globalInKey in mret[localKey]:
                 continue
-            for globalInKey in globalManifest[localKey]:
-                if globalInKey in mret[localKey]:
-                    continue
-                mret[localKey][globalInKey] = globalManifest[localKey][globalInKey]
-    return mret
+            mret[localKey][globalInKey] = globalManifest[localKey][globalInKey]
+    _mergedCache[cacheKey] = ((localStamp, globalStamp), mret)
+    return _copyManifest(mret)
 
 @contextmanager
 def modifyManifest(mtype):
-    """ Context manager for manipulating a manifest file. """
+    """ Context manager for manipulating a manifest file. The file is only rewritten if the
+    manifest was changed. """
     fileName = f".cpu.{mtype}_manifest.json"
     requireManifest(mtype)
-    loadedM = loadManifestFrom(fileName)
-    yield loadedM
-    saveManifestTo(loadedM, fileName)
-
+    with tracing.span("modifyManifest", mtype = mtype):
+        originalM = _readManifest(fileName)[2]
+        loadedM = _copyManifest(originalM)
+        yield loadedM
+        # Commands that only read the manifest skip encoding it
+        if _isModified(loadedM, originalM):
+            saveManifestTo(loadedM, fileName)
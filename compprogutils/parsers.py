@@ -1,70 +1,167 @@
-import os
+import os, re, codecs, itertools, functools
 
 from compprogutils import cpu_errors
 
 WHITESPACE = "\n\r\t "
+# Matches a single token, i.e. a maximal run of non-whitespace characters
+TOKEN_PATTERN = re.compile(f"[^{WHITESPACE}]+")
+# str.split() also splits on these characters, on top of WHITESPACE and non-ASCII whitespace
+_OTHER_ASCII_WHITESPACE = "\x0b\x0c\x1c\x1d\x1e\x1f"
+# How much a FileParser reads from its stream at once
+CHUNK_SIZE = 1 << 20
+
+@functools.lru_cache(maxsize = None)
+def _delimiterPattern(charSet):
+    """ Return a compiled pattern matching any single character of the string charSet,
+    or None if charSet is empty. """
+    if not charSet:
+        return None
+    return re.compile(f"[{re.escape(charSet)}]")
+
+def _splitTokens(s):
+    """ Return the tokens of s. Uses str.split, which is much faster than TOKEN_PATTERN,
+    unless s has characters that str.split treats as whitespace but cpu does not. """
+    if s.isascii() and not any(c in s for c in _OTHER_ASCII_WHITESPACE):
+        return s.split()
+    return TOKEN_PATTERN.findall(s)
 
 class StringParser:
     """Tool for extracting data from a string."""
     def __init__(self, strng):
         self.inString = strng
         self.curID = 0
+    def _extend(self):
+        """ Add more data to the end of inString. Return False if there is no more data. """
+        return False
+    def _completeTokensEnd(self):
+        """ Return a position in inString such that every token before it is complete. """
+        return len(self.inString)
+    def _atEOF(self):
+        """ Called when a read finds no more data. """
+        return None
     def curChar(self, moveToNext = False, exceptionOnEOF = False):
-        if self.curID < len(self.inString):
-            retVal = self.inString[self.curID]
-            if moveToNext:
-                self.curID += 1
-            return retVal
-        else:
-            if exceptionOnEOF:
-                raise cpu_errors.UnexpectedEOF(f"""EOF on attempted char find""")
-            else:
-                return None
+        while self.curID >= len(self.inString):
+            if not self._extend():
+                if exceptionOnEOF:
+                    raise cpu_errors.UnexpectedEOF(f"""EOF on attempted char find""")
+                return self._atEOF()
+        retVal = self.inString[self.curID]
+        if moveToNext:
+            self.curID += 1
+        return retVal
     def readUntil(self, charSet = WHITESPACE, skipOver = True):
         """ Read until a character in charSet is found. By default, this is whitespace.
         Skip over this character, unless skipOver is false.
         Return the read string. """
-        charsRead = []
-        while self.curChar() is not None:
-            cChar = self.curChar()
-            if cChar in charSet:
-                if skipOver:
-                    self.curChar(moveToNext = True)
-                break
-            charsRead.append(self.curChar(moveToNext = True))
-        return ''.join(charsRead)
+        if self.curChar() is None:
+            return ""
+        pattern = _delimiterPattern(''.join(charSet))
+        searchFrom = self.curID
+        while True:
+            found = None if pattern is None else pattern.search(self.inString, searchFrom)
+            if found is not None:
+                charsRead = self.inString[self.curID:found.start()]
+                self.curID = found.start() + (1 if skipOver else 0)
+                return charsRead
+            searchFrom = len(self.inString) - self.curID
+            if not self._extend():
+                charsRead = self.inString[self.curID:]
+                self.curID = len(self.inString)
+                return charsRead
+            # _extend drops the part of inString before curID
+            searchFrom += self.curID
     def readData(self, dataType, charSet = WHITESPACE, skipOver = True):
         """ Read a single member of dataType from the string. dataType should have
         a constructor that accepts a string. Raises ValueError if it is not found. """
         possibleInt = self.readUntil(charSet, skipOver)
         return dataType(possibleInt)
+    def readTokens(self, count = None):
+        """ Read count whitespace-separated tokens, skipping any whitespace around them, and return them
+        as a list of strings. If count is None, read all the remaining tokens. Raises UnexpectedEOF
+        if fewer than count tokens remain. """
+        tokens = []
+        while True:
+            end = self._completeTokensEnd()
+            if count is None:
+                tokens += self._takeCompleteTokens(end)
+            else:
+                for match in itertools.islice(TOKEN_PATTERN.finditer(self.inString, self.curID, end), count - len(tokens)):
+                    tokens.append(match.group())
+                    # Skip over the delimiter, like readData does
+                    self.curID = min(match.end() + 1, end)
+                if len(tokens) < count:
+                    self.curID = end
+            if count is not None and len(tokens) >= count:
+                break
+            if not self._extend() and self.curID >= len(self.inString):
+                break
+        if count is not None and len(tokens) < count:
+            raise cpu_errors.UnexpectedEOF(f"""EOF after reading {len(tokens)} of {count} tokens""")
+        return tokens
+    def _takeCompleteTokens(self, end):
+        """ Read and return the tokens between the current position and end. """
+        tokens = _splitTokens(self.inString[self.curID:end])
+        self.curID = end
+        return tokens
+    def iterTokenBatches(self):
+        """ Read all the remaining tokens, yielding them in lists as they become available. Unlike
+        readTokens, this does not hold all the tokens at once. Empty lists are never yielded. """
+        while True:
+            tokens = self._takeCompleteTokens(self._completeTokensEnd())
+            if tokens:
+                yield tokens
+            if not self._extend() and self.curID >= len(self.inString):
+                return
+    def readDataList(self, dataType, count = None):
+        """ Read count members of dataType (all the remaining ones if count is None), and return
+        them as a list. This is much faster than calling readData count times. """
+        return list(map(dataType, self.readTokens(count)))
 
 class FileParser(StringParser):
-    """ Tool for extracting data from a file. """
+    """ Tool for extracting data from a file. The file can be opened in text or binary mode;
+    binary files are decoded as UTF-8. The file is read in chunks of CHUNK_SIZE. """
     def __init__(self, byteStream):
+        super().__init__("")
         self.byteStream = byteStream
-        self.streamHead = None
-    def curChar(self, moveToNext = False):
-        if self.streamHead is None:
-            self.streamHead = self.byteStream.read(1)
-        retVal = self.streamHead
-        if retVal == "":
-            raise cpu_errors.UnexpectedEOF(f"""EOF on attempted char find""")
-        if moveToNext:
-            self.streamHead = self.byteStream.read(1)
-        return retVal
+        self.decoder = codecs.getincrementaldecoder("utf-8")()
+        self.reachedEOF = False
+        self.tokensEnd = 0
+    def _extend(self):
+        if self.reachedEOF:
+            return False
+        chunk = ""
+        # A read that ends inside a character decodes to nothing, so EOF is told by the raw data
+        while not chunk:
+            rawChunk = self.byteStream.read(CHUNK_SIZE)
+            if isinstance(rawChunk, bytes):
+                chunk = self.decoder.decode(rawChunk, final = not rawChunk)
+            else:
+                chunk = rawChunk
+            if not rawChunk:
+                self.reachedEOF = True
+                return False
+        self.inString = self.inString[self.curID:] + chunk
+        self.curID = 0
+        # Tokens are complete up to the last whitespace character
+        self.tokensEnd = max(self.inString.rfind(c) for c in WHITESPACE) + 1
+        return True
+    def _completeTokensEnd(self):
+        if self.reachedEOF:
+            return len(self.inString)
+        return max(self.curID, self.tokensEnd)
+    def _atEOF(self):
+        raise cpu_errors.UnexpectedEOF(f"""EOF on attempted char find""")
 
 def tokenize(fileStream, removeEmptyTokens = True):
     """ Return all the whitespace-separated tokens of the file in fileStream. If removeEmptyTokens
     is true, all empty tokens are deleted from the final list."""
     fp = FileParser(fileStream)
-    tokensRead = []
-    while True:
-        try:
-            tokensRead.append(fp.readData(str))
-        except cpu_errors.UnexpectedEOF as e:
-            break
     if removeEmptyTokens:
-        tokensRead = [token for token in tokensRead if token != ""]
+        return fp.readTokens()
+    # Every whitespace character ends a token, so consecutive whitespace gives empty tokens
+    while fp._extend():
+        pass
+    tokensRead = re.split(f"[{WHITESPACE}]", fp.inString[fp.curID:])
+    if tokensRead[-1] == "":
+        tokensRead.pop()
     return tokensRead
-
@@ -0,0 +1,167 @@
+""" Module for running cpu as a resident server (the cpu daemon).
+
+The server runs in the background for a contest, and runs the commands that the cpu client forwards
+to it over a Unix socket. Since it stays alive, the manifests and configuration it loaded are kept in
+memory between commands; they are read again only when their files change. The client passes its
+stdin, stdout and stderr along with the command, so commands behave as if run by the client itself. """
+
+import json, os, signal, sys, time
+
+from compprogutils import cpu_errors, utilities
+
+# Every cpu command checks for a daemon, so only what that check needs is loaded up front
+cpu, socket, subprocess, threading, traceback = map(utilities.lazyImport, ["compprogutils.cpu", "socket",
+                                                                           "subprocess", "threading", "traceback"])
+
+SOCKET_NAME = ".cpu.daemon.sock"
+# Setting this environment variable makes the client run commands itself
+DISABLE_VARIABLE = "CPU_NO_DAEMON"
+# Largest request or reply, in bytes
+MESSAGE_SIZE = 1 << 16
+
+def contestDirectory():
+    """ Return the folder of the contest that the current directory belongs to. Raise a NotInCPUDirectory
+    error if the current directory is neither a contest folder nor a problem folder in a contest. """
+    if os.path.isfile(".cpu.contest_manifest.json"):
+        return os.getcwd()
+    if os.path.isfile(".cpu.problem_manifest.json") and \
+            os.path.isfile(os.path.join(os.pardir, ".cpu.contest_manifest.json")):
+        return os.path.abspath(os.pardir)
+    raise cpu_errors.NotInCPUDirectory("""The cpu daemon runs for a whole contest. Make sure
+you are in a contest folder or one of its problem folders.""")
+
+def findSocket():
+    """ Return the path of the daemon socket for the current directory, or None if there is none. """
+    for directory in [os.curdir, os.pardir]:
+        socketPath = os.path.join(directory, SOCKET_NAME)
+        if os.path.exists(socketPath):
+            return socketPath
+    return None
+
+def forward(argv):
+    """ Ask the daemon to run the command line argv. Return the exit code of the command,
+    or None if no daemon is running, in which case the command should be run locally. """
+    socketPath = None if os.environ.get(DISABLE_VARIABLE) else findSocket()
+    if socketPath is None:
+        return None
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+    try:
+        client.connect(socketPath)
+    except OSError:
+        # The daemon is gone, but left its socket behind
+        client.close()
+        return None
+    with client:
+        request = {"argv" : argv, "cwd" : os.getcwd()}
+        socket.send_fds(client, [json.dumps(request).encode()], [0, 1, 2])
+        while True:
+            try:
+                reply = client.recv(MESSAGE_SIZE)
+                break
+            except KeyboardInterrupt:
+                client.send(json.dumps({"interrupt" : True}).encode())
+    if not reply:
+        return 1
+    return json.loads(reply)["exit"]
+
+def start(directory):
+    """ Start a daemon for the contest in directory, in the background. Return once it accepts commands. """
+    socketPath = os.path.join(directory, SOCKET_NAME)
+    if os.path.exists(socketPath):
+        raise cpu_errors.DaemonError(f"""A cpu daemon is already running for this contest. If it is not,
+delete {socketPath} and try again.""")
+    # A new session keeps the daemon off the terminal, so programs it runs can read from the client's terminal
+    subprocess.Popen([sys.executable, "-c", "import sys; from compprogutils import server; server.serve(sys.argv[1])",
+                      directory], start_new_session = True, stdin = subprocess.DEVNULL,
+                      stdout = subprocess.DEVNULL, stderr = subprocess.DEVNULL)
+    for _ in range(100):
+        if os.path.exists(socketPath):
+            return
+        time.sleep(0.05)
+    raise cpu_errors.DaemonError("""The cpu daemon did not start.""")
+
+def stop(directory):
+    """ Stop the daemon for the contest in directory. Return False if none was running. """
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+    try:
+        client.connect(os.path.join(directory, SOCKET_NAME))
+    except OSError:
+        return False
+    with client:
+        client.send(json.dumps({"stop" : True}).encode())
+        client.recv(MESSAGE_SIZE)
+    return True
+
+def serve(directory):
+    """ Serve commands forwarded to the socket in directory, one at a time, until asked to stop. """
+    socketPath = os.path.join(directory, SOCKET_NAME)
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+    listener.bind(socketPath)
+    listener.listen()
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+    try:
+        while True:
+            connection, _ = listener.accept()
+            with connection:
+                message, fds, _, _ = socket.recv_fds(connection, MESSAGE_SIZE, 3)
+                request = json.loads(message)
+                if request.get("stop"):
+                    connection.send(json.dumps({"exit" : 0}).encode())
+                    break
+                exitCode = _runForwarded(connection, request, fds)
+                try:
+                    connection.send(json.dumps({"exit" : exitCode}).encode())
+                except OSError:
+                    pass
+    finally:
+        listener.close()
+        os.remove(socketPath)
+
+def _runForwarded(connection, request, fds):
+    """ Run the command in request with the client's standard streams fds, and return its exit code.
+    The command is interrupted if the client asks for it or disconnects. """
+    savedFds = [os.dup(fd) for fd in range(3)]
+    savedStreams = sys.stdin, sys.stdout, sys.stderr
+    previousDir = os.getcwd()
+    finished = threading.Event()
+    interruptLock = threading.Lock()
+    def watchClient():
+        # Any message, or the client disconnecting, interrupts the command
+        try:
+            connection.recv(MESSAGE_SIZE)
+        except OSError:
+            pass
+        with interruptLock:
+            if not finished.is_set():
+                os.kill(os.getpid(), signal.SIGINT)
+    try:
+        for fd, clientFd in enumerate(fds):
+            os.dup2(clientFd, fd)
+            os.close(clientFd)
+        sys.stdin = open(0, "r", closefd = False)
+        sys.stdout = open(1, "w", closefd = False, buffering = 1 if os.isatty(1) else -1)
+        sys.stderr = open(2, "w", closefd = False, buffering = 1)
+        os.chdir(request["cwd"])
+        threading.Thread(target = watchClient, daemon = True).start()
+        try:
+            cpu.runCommand(request["argv"])
+            return 0
+        except SystemExit as e:
+            return e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+        except Exception:
+            traceback.print_exc()
+            return 1
+        finally:
+            with interruptLock:
+                finished.set()
+    except KeyboardInterrupt:
+        # An interrupt that arrived after the command finished
+        return 130
+    finally:
+        for stream in (sys.stdout, sys.stderr):
+            stream.flush()
+        sys.stdin, sys.stdout, sys.stderr = savedStreams
+        for fd, savedFd in enumerate(savedFds):
+            os.dup2(savedFd, fd)
+            os.close(savedFd)
+        os.chdir(previousDir)
@@ -1,34 +1,69 @@
 """ Module for managing solutions. """
 
-from compprogutils import executables, cpu_errors
+import subprocess
 
-class SolutionResult:
-    """ Object that holds teh result of a solution. Has 3 members:
-        the output, the generated data, and the time elapsed. """
-    def __init__(self, output, data, timeElapsed):
-        self.output = output
+from compprogutils import executables, streams
+
+class SolutionResult(executables.RunResult):
+    """ Object that holds the result of a solution. Adds the generated data
+        to the members of RunResult. """
+    def __init__(self, output, data, timeElapsed, cpuTime = None, peakMemory = None):
+        super().__init__(output, timeElapsed, cpuTime, peakMemory)
         self.data = data
-        self.timeElapsed = timeElapsed
     def __repr__(self):
-        return f"SolutionResult(output = {self.output}, data = {self.data}, timeElapsed = {self.timeElapsed})"
+        return f"SolutionResult(output = {self.output}, data = {self.data}, timeElapsed = {self.timeElapsed}, cpuTime = {self.cpuTime}, peakMemory = {self.peakMemory})"
 
 DATA_ESCAPE = "\xDA\x7A\xF0\x11\x05"
+# DATA_ESCAPE as it appears in the output of a solution
+DATA_ESCAPE_BYTES = DATA_ESCAPE.encode('utf-8')
 
 class Solution(executables.Executable):
     """ Represents solution executables. Adds the ability to
     split a solution's output, and extra data it may generate."""
-    def run(self, pipeToTerminal = False, *args, **kwargs):
-        """ Runs the solution, sending all arguments to the parent
-        executable. """
-        runResult = super().run(pipeToTerminal = pipeToTerminal, *args, **kwargs)
-        if runResult[0] is None:
-            return SolutionResult(None, None, runResult[1])
-        outputSplit = runResult[0].split(DATA_ESCAPE)
-        result = SolutionResult(outputSplit[0], None, runResult[1])
-        if len(outputSplit) > 2:
-            raise cpu_errors.MalformedDataDelimiter("""You printed more than one data delimiter in your solution. """)
-        if len(outputSplit) == 2:
-            result.data = outputSplit[1]
-        return result
+    def run(self, pipeToTerminal = False, dataSink = None, *args, **kwargs):
+        """ Runs the solution, sending all arguments to the parent executable.
+        The output is split as in run_async. """
+        kwargs, finish = self._splitOutput(pipeToTerminal, dataSink, kwargs)
+        return finish(super().run(pipeToTerminal = pipeToTerminal, *args, **kwargs))
 
+    async def run_async(self, pipeToTerminal = False, dataSink = None, *args, **kwargs):
+        """ Runs the solution, sending all arguments to the parent
+        executable. Unless the output goes to the terminal, it is split at
+        DATA_ESCAPE as it is read: the part before goes wherever the parent
+        executable would send the output, and the part after goes to dataSink.
+        If dataSink is not given, the data is returned along with the output if
+        the output is returned, and discarded otherwise. """
+        kwargs, finish = self._splitOutput(pipeToTerminal, dataSink, kwargs)
+        return finish(await super().run_async(pipeToTerminal = pipeToTerminal, *args, **kwargs))
 
+    def _splitOutput(self, pipeToTerminal, dataSink, kwargs):
+        """ Return the keyword arguments to run the parent executable with, so that its output is split
+        at DATA_ESCAPE, and a function that turns the RunResult of that run into a SolutionResult. """
+        if pipeToTerminal:
+            def finish(runResult):
+                return SolutionResult(None, None, runResult.timeElapsed, runResult.cpuTime, runResult.peakMemory)
+            return kwargs, finish
+        kwargs = dict(kwargs)
+        fileToWrite = kwargs.pop("fileToWrite", subprocess.PIPE)
+        outputSink = kwargs.pop("outputSink", None)
+        outputBuffer = dataBuffer = None
+        if outputSink is None:
+            if fileToWrite == subprocess.PIPE:
+                outputSink = outputBuffer = streams.BufferSink()
+            else:
+                outputSink = streams.FileSink(fileToWrite)
+        if dataSink is None:
+            if outputBuffer is None:
+                dataSink = streams.NullSink()
+            else:
+                dataSink = dataBuffer = streams.BufferSink()
+        splitter = streams.DelimitedSink(outputSink, dataSink, DATA_ESCAPE_BYTES)
+        kwargs["outputSink"] = splitter
+        def finish(runResult):
+            result = SolutionResult(None, None, runResult.timeElapsed, runResult.cpuTime, runResult.peakMemory)
+            if outputBuffer is not None:
+                result.output = outputBuffer.getvalue().decode('utf-8')
+            if dataBuffer is not None and splitter.delimiterFound:
+                result.data = dataBuffer.getvalue().decode('utf-8')
+            return result
+        return kwargs, finish
@@ -0,0 +1,83 @@
+""" Module for sinks, which receive the output of a program as it is produced.
+
+A sink has a write method, which takes a bytes object, and a close method, which is called
+once all the output has been written. """
+
+from compprogutils import cpu_errors
+
+class BufferSink:
+    """ Sink that keeps everything written to it in memory. """
+    def __init__(self):
+        self.chunks = []
+    def write(self, chunk):
+        self.chunks.append(chunk)
+    def close(self):
+        pass
+    def getvalue(self):
+        """ Return everything written so far, as bytes. """
+        return b"".join(self.chunks)
+
+class FileSink:
+    """ Sink that writes to an open file. The file may be in text or binary mode. """
+    def __init__(self, fileObj):
+        if hasattr(fileObj, "buffer"):
+            fileObj.flush()
+            fileObj = fileObj.buffer
+        self.fileObj = fileObj
+    def write(self, chunk):
+        self.fileObj.write(chunk)
+    def close(self):
+        self.fileObj.flush()
+
+class LazyFileSink:
+    """ Sink that writes to the file with the given name. The file is only created if
+    something is written. """
+    def __init__(self, fileName):
+        self.fileName = fileName
+        self.fileObj = None
+    def write(self, chunk):
+        if self.fileObj is None:
+            self.fileObj = open(self.fileName, "wb")
+        self.fileObj.write(chunk)
+    def close(self):
+        if self.fileObj is not None:
+            self.fileObj.close()
+
+class NullSink:
+    """ Sink that discards everything written to it. """
+    def write(self, chunk):
+        pass
+    def close(self):
+        pass
+
+class DelimitedSink:
+    """ Sink that sends everything before delimiter to beforeSink, and everything after it to afterSink.
+    The delimiter is found even if it is split between writes. Raises MalformedDataDelimiter if the
+    delimiter appears more than once. """
+    def __init__(self, beforeSink, afterSink, delimiter):
+        self.beforeSink = beforeSink
+        self.afterSink = afterSink
+        self.delimiter = delimiter
+        self.delimiterFound = False
+        # Data that may be the start of a delimiter, held back until the next write
+        self.pending = b""
+    def write(self, chunk):
+        data = self.pending + chunk
+        index = data.find(self.delimiter)
+        if index != -1:
+            if self.delimiterFound or data.find(self.delimiter, index + len(self.delimiter)) != -1:
+                raise cpu_errors.MalformedDataDelimiter("""You printed more than one data delimiter in your solution. """)
+            self.beforeSink.write(data[:index])
+            self.delimiterFound = True
+            data = data[index + len(self.delimiter):]
+        safeLength = max(0, len(data) - len(self.delimiter) + 1)
+        self.currentSink().write(data[:safeLength])
+        self.pending = data[safeLength:]
+    def close(self):
+        self.currentSink().write(self.pending)
+        self.pending = b""
+        self.beforeSink.close()
+        self.afterSink.close()
+    def currentSink(self):
+        """ Return the sink that data is currently sent to. """
+        return self.afterSink if self.delimiterFound else self.beforeSink
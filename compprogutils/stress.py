@@ -0,0 +1,136 @@
+""" Module for stress testing a solution against a solution known to be correct.
+
+Rounds are run in a scratch folder (in tmpfs when available) without touching the problem
+manifest. Only a test that breaks the solution is saved as a real test. """
+
+import os, shutil, tempfile
+# For running rounds in parallel
+import concurrent.futures, threading, itertools, math
+
+from compprogutils import manifests, tests, judging, streams, executables
+
+# Prefer a memory-backed folder for scratch files
+SCRATCH_ROOT = "/dev/shm" if os.path.isdir("/dev/shm") else None
+
+class StressEngine:
+    """ Runs stress rounds. In each round, the generator writes an input, the accepted solution
+    writes the expected output, and the solution under test is judged with the checker.
+
+    Use as a context manager, so the scratch folder is deleted afterwards. """
+    def __init__(self, genExec, acExec, stressExec, checkerExec, timeout = None):
+        self.genExec = genExec
+        self.acExec = acExec
+        self.stressExec = stressExec
+        self.checkerExec = checkerExec
+        self.timeout = timeout
+        self.scratchDirectory = None
+
+    def __enter__(self):
+        self.scratchDirectory = tempfile.mkdtemp(prefix = "cpu-stress-", dir = SCRATCH_ROOT)
+        return self
+
+    def __exit__(self, *excInfo):
+        shutil.rmtree(self.scratchDirectory, ignore_errors = True)
+
+    def runRound(self, roundName, genArgs = []):
+        """ Run a single round, passing genArgs to the generator. Scratch files are named after
+        roundName. Return the round's scratch Test and its TestVerdict. """
+        roundTest = tests.Test(roundName, testPath = self.scratchDirectory)
+        with roundTest.getFileObject(tests.TestFile.INPUT, "wb") as inputFile:
+            self.genExec.run(cmdArgs = genArgs, fileToWrite = inputFile)
+        with roundTest.getFileObject(tests.TestFile.INPUT, "rb") as inputFile:
+            with roundTest.getFileObject(tests.TestFile.OUTPUT, "wb") as outputFile:
+                self.acExec.run(fileInput = inputFile, fileToWrite = outputFile, timeout = self.timeout,
+                                dataSink = streams.LazyFileSink(roundTest.getFilename(tests.TestFile.DATA)))
+        outputCheckName = os.path.join(self.scratchDirectory, f"{roundName}.check")
+        verdict = judging.judgeTest(self.stressExec, self.checkerExec, roundName, roundTest,
+                                    outputCheckName, timeout = self.timeout)
+        return roundTest, verdict
+
+    def discardRound(self, roundTest):
+        """ Delete the scratch files of a round. """
+        roundTest.deleteFiles()
+        try:
+            os.remove(os.path.join(self.scratchDirectory, f"{roundTest.ID}.check"))
+        except FileNotFoundError:
+            pass
+
+    def findFailure(self, rounds = -1, jobs = 1, seedFrom = None, onRoundStart = None):
+        """ Run rounds 1, 2, ... until one breaks the solution, or until `rounds` rounds are run
+        (-1 means no limit). Up to jobs rounds run at the same time. If seedFrom is given, round k
+        passes seedFrom + k - 1 to the generator as its only argument. onRoundStart, if given, is
+        called with the index of each round as it starts.
+
+        Once a round fails, no later rounds are started, and the programs of later rounds that are
+        running are killed. Earlier rounds that are running still finish, and the failing round with
+        the lowest index is kept, so with seeded generators the result does not depend on jobs. Return
+        (roundTest, verdict) for that round, or None if no round failed. The scratch files of every
+        other round are deleted. """
+        lock = threading.Lock()
+        roundCounter = itertools.count(1)
+        failures = {}
+        # The RunScope of each round that is running
+        runningRounds = {}
+        # Index of the first round that must not be started
+        stopAt = [math.inf if rounds == -1 else rounds + 1]
+        def worker():
+            while True:
+                with lock:
+                    roundIndex = next(roundCounter)
+                    if roundIndex >= stopAt[0]:
+                        return
+                    roundScope = runningRounds[roundIndex] = executables.RunScope()
+                    if onRoundStart is not None:
+                        onRoundStart(roundIndex)
+                genArgs = [] if seedFrom is None else [str(seedFrom + roundIndex - 1)]
+                try:
+                    with roundScope:
+                        roundTest, verdict = self.runRound(str(roundIndex), genArgs)
+                except BaseException:
+                    with lock:
+                        del runningRounds[roundIndex]
+                        if not roundScope.stopped:
+                            stopAt[0] = 0
+                    if not roundScope.stopped:
+                        raise
+                    # The round was stopped as an earlier round failed, which is why its programs failed
+                    self.discardRound(tests.Test(str(roundIndex), testPath = self.scratchDirectory))
+                    continue
+                with lock:
+                    del runningRounds[roundIndex]
+                    failed = verdict.score < 1 and not roundScope.stopped
+                    if failed:
+                        failures[roundIndex] = (roundTest, verdict)
+                        stopAt[0] = min(stopAt[0], roundIndex)
+                        for laterIndex, laterScope in runningRounds.items():
+                            if laterIndex > roundIndex:
+                                laterScope.stop()
+                if not failed:
+                    self.discardRound(roundTest)
+        with executables.interruptiblePool(concurrent.futures.ThreadPoolExecutor(max_workers = jobs)) as pool:
+            workers = [pool.submit(worker) for _ in range(jobs)]
+            try:
+                for future in workers:
+                    future.result()
+            except BaseException:
+                with lock:
+                    stopAt[0] = 0
+                raise
+        if not failures:
+            return None
+        firstFailure = min(failures)
+        for roundIndex, (roundTest, verdict) in failures.items():
+            if roundIndex != firstFailure:
+                self.discardRound(roundTest)
+        return failures[firstFailure]
+
+def persistTest(roundTest):
+    """ Copy the files of the scratch test roundTest into a new test of the problem, and
+    register it in the manifest. Return the new test's ID. """
+    with manifests.modifyManifest("problem") as m:
+        newTest = tests.getUnusedTest(m["tests"])
+        for testFile in tests.TestFile:
+            if roundTest.checkFileExists(testFile):
+                shutil.copyfile(roundTest.getFilename(testFile), newTest.getFilename(testFile))
+        m["tests"][newTest.ID] = newTest
+    return newTest.ID
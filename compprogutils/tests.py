@@ -1,12 +1,13 @@
 """ Module for managing cpu test objects. """
 
-import itertools
+import itertools, re
 import enum
-import shutil, os
+import shutil, os, tempfile
+from contextlib import contextmanager
 
-import textwrap, terminaltables
+from compprogutils import utilities, configuration, tracing
 
-from compprogutils import utilities, configuration
+terminaltables, blobs = map(utilities.lazyImport, ["terminaltables", "compprogutils.blobs"])
 
 TEST_PATH = "tests"
 
@@ -23,17 +24,22 @@ class Test:
     output file, and a data file in case the checker needs any
     auxilliary information. Only the input file is given upon
     constuction; the output and data files must be generated
-    through other means.
+    through other means. The files are stored in testPath, which is
+    the problem's tests/ folder unless stated otherwise.
+
+    A file may be kept in the blob store (see the blobs module), possibly
+    compressed. getFileObject and getFileContents read such files
+    transparently; programs that need a file name should use localFilename.
     """
-    def __init__(self, ID):
-       self.fileTable = {typ: os.path.join(TEST_PATH, f"{ID}.{suffix}") for typ, suffix in
+    def __init__(self, ID, testPath = TEST_PATH):
+       self.fileTable = {typ: os.path.join(testPath, f"{ID}.{suffix}") for typ, suffix in
                 zip(TestFile, ["in", "out", "data"])}
        self.ID = ID
 
     def writeToTestFile(self, testFile, contents):
         """ Writes contents to the given testFile. testFile must be
         a member of the TestFile enum. """
-        with open(self.fileTable[testFile], "w") as f:
+        with self.getFileObject(testFile, "w") as f:
             f.write(contents)
 
     def getFilename(self, testFile):
@@ -41,18 +47,75 @@ class Test:
         a member of the TestFile enum. """
         return self.fileTable[testFile]
 
+    def getStoredFilename(self, testFile):
+        """ Return the name of the file the given testFile is actually stored in, which has
+        a compression suffix if it is compressed. """
+        fileName = self.fileTable[testFile]
+        if os.path.isfile(fileName):
+            return fileName
+        for variant in blobs.storedVariants(fileName)[1:]:
+            if os.path.isfile(variant):
+                return variant
+        return fileName
+
     def checkFileExists(self, testFile):
         """ Return True iff the given testFile exists. """
-        return os.path.isfile(self.fileTable[testFile])
-
-    def getFileObject(self, testFile, *args, **kwargs):
-        """ Calls `open` on the specified testFile. All other arguments are passed to `open`. """
-        return open(self.fileTable[testFile], *args, **kwargs)
+        return os.path.isfile(self.getStoredFilename(testFile))
+
+    def getFileObject(self, testFile, mode = "r", *args, **kwargs):
+        """ Calls `open` on the specified testFile. All other arguments are passed to `open`.
+        Compressed files are decompressed as they are read. Before the file is written, it is
+        unlinked from the blob store, and any compressed copy is deleted. """
+        if any(writeMode in mode for writeMode in "wax+"):
+            if "w" in mode or "x" in mode:
+                self.deleteFiles(testFile)
+            else:
+                self.unpackFile(testFile)
+                blobs.unshareFile(self.fileTable[testFile])
+            return open(self.fileTable[testFile], mode, *args, **kwargs)
+        return blobs.openStored(self.getStoredFilename(testFile), mode, *args, **kwargs)
 
     def getFileContents(self, testFile, default = "[None]", maxLines = None):
         """ Returns a string with the contents of the file's first `maxLines` lines. If the file does not exist, return
         default. """
-        return utilities.getFileContents(self.fileTable[testFile], default, maxLines)
+        return utilities.getFileContents(self.getStoredFilename(testFile), default, maxLines, opener = blobs.openStored)
+
+    @contextmanager
+    def localFilename(self, testFile):
+        """ Context manager that gives the name of a plain file with the contents of testFile, for
+        programs that read the file themselves. If testFile is compressed, it is decompressed into
+        a temporary file, which is deleted afterwards. """
+        storedName = self.getStoredFilename(testFile)
+        if blobs.compressionOf(storedName) is None:
+            yield storedName
+            return
+        fd, tempName = tempfile.mkstemp(prefix = f"cpu-test-{self.ID}-")
+        try:
+            with os.fdopen(fd, "wb") as tempFile:
+                with blobs.openStored(storedName, "rb") as storedFile:
+                    shutil.copyfileobj(storedFile, tempFile)
+            yield tempName
+        finally:
+            os.remove(tempName)
+
+    def storeFiles(self, compression = None):
+        """ Move the files of this test into the blob store, compressed with compression (None for
+        no compression). """
+        for testFile in TestFile:
+            storedName = self.getStoredFilename(testFile)
+            if os.path.isfile(storedName):
+                blobs.storeFile(storedName, compression)
+
+    def unpackFile(self, testFile):
+        """ Replace testFile with a plain, uncompressed copy if it is compressed. """
+        storedName = self.getStoredFilename(testFile)
+        if blobs.compressionOf(storedName) is not None:
+            tempName = f"{self.fileTable[testFile]}.tmp"
+            with blobs.openStored(storedName, "rb") as storedFile:
+                with open(tempName, "wb") as plainFile:
+                    shutil.copyfileobj(storedFile, plainFile)
+            os.replace(tempName, self.fileTable[testFile])
+            os.remove(storedName)
 
     def __serialize__(self):
         """ Return a JSON-serializable dict which decodes to an equivalent test. """
@@ -63,16 +126,17 @@ class Test:
         return f"Test({self.ID})"
 
     def __str__(self):
-        inputSizeBytes = os.path.getsize(self.getFilename(TestFile.INPUT))
+        inputSizeBytes = os.path.getsize(self.getStoredFilename(TestFile.INPUT))
         outputSizeBytes = None
         try:
-            outputSizeBytes = os.path.getsize(self.getFilename(TestFile.OUTPUT))
+            outputSizeBytes = os.path.getsize(self.getStoredFilename(TestFile.OUTPUT))
         except OSError: # this will be raised if the output file does not exist yet
             pass
         inputSizeRepr = utilities.humanizeFileSize(inputSizeBytes)
         outputSizeRepr = "None" if outputSizeBytes is None else utilities.humanizeFileSize(outputSizeBytes)
         return f"Test {self.ID} [{inputSizeRepr} | {outputSizeRepr}]"
 
+    @tracing.traced("testDisplayTable", lambda self, maxLines: {"test" : self.ID})
     def testDisplayTable(self, maxLines):
         """ Return a terminaltables.SingleTable representing the truncated contents of this test. """
         table = terminaltables.SingleTable([])
@@ -80,8 +144,10 @@ class Test:
         if configuration.getConfig()["display_io_side_by_side"]:
             colWidth = (shutil.get_terminal_size().columns // 2) - 4
             table.table_data.append(["Input".ljust(colWidth), "Output".ljust(colWidth)])
-            inputLines = utilities.wrapFileContentsList(self.fileTable[TestFile.INPUT], colWidth, maxLines)
-            outputLines = utilities.wrapFileContentsList(self.fileTable[TestFile.OUTPUT], colWidth, maxLines)
+            inputLines = utilities.wrapFileContentsList(self.getStoredFilename(TestFile.INPUT), colWidth, maxLines,
+                                                        opener = blobs.openStored)
+            outputLines = utilities.wrapFileContentsList(self.getStoredFilename(TestFile.OUTPUT), colWidth, maxLines,
+                                                         opener = blobs.openStored)
             tableHeight = max(len(inputLines), len(outputLines))
             inputLines = utilities.padListRight(inputLines, tableHeight, "")
             outputLines = utilities.padListRight(outputLines, tableHeight, "")
@@ -91,29 +157,58 @@ class Test:
             colWidth = shutil.get_terminal_size().columns - 5
             table.inner_row_border = True
             table.table_data.append(["Input".ljust(colWidth)])
-            table.table_data.append(['\n'.join(utilities.wrapFileContentsList(self.fileTable[TestFile.INPUT], colWidth, maxLines))])
+            table.table_data.append(['\n'.join(utilities.wrapFileContentsList(self.getStoredFilename(TestFile.INPUT), colWidth,
+                                                                              maxLines, opener = blobs.openStored))])
             table.table_data.append(["Output".ljust(colWidth)])
-            table.table_data.append(['\n'.join(utilities.wrapFileContentsList(self.fileTable[TestFile.OUTPUT], colWidth, maxLines))])
+            table.table_data.append(['\n'.join(utilities.wrapFileContentsList(self.getStoredFilename(TestFile.OUTPUT), colWidth,
+                                                                              maxLines, opener = blobs.openStored))])
             return table
 
-    def deleteFiles(self):
-        """ Deletes all the files this test contains. """
-        for fileName in self.fileTable.values():
-            try:
-                os.remove(fileName)
-            except FileNotFoundError:
-                pass
+    def deleteFiles(self, *testFiles):
+        """ Deletes the given testFiles, or all the files this test contains if none are given. """
+        for testFile in testFiles or self.fileTable:
+            for fileName in blobs.storedVariants(self.fileTable[testFile]):
+                try:
+                    os.remove(fileName)
+                except FileNotFoundError:
+                    pass
 
     @classmethod
     def __deserialize__(cls, obj):
         result = Test(obj["ID"])
         return result
 
-def getUnusedTest(testList):
-    """ Get an unused test from the provided test manifest
-    in testList. """
+def unusedTestIDs(testList):
+    """ Generate the test IDs not used in the test manifest in testList, in increasing order.
+    Generating k IDs takes O(len(testList) + k) time in total. """
     for i in itertools.count(1):
         if str(i) not in testList:
-            return Test(str(i))
-
+            yield str(i)
 
+def getUnusedTest(testList):
+    """ Get an unused test from the provided test manifest
+    in testList. """
+    return Test(next(unusedTestIDs(testList)))
+
+# Extensions recognized when importing tests, and the test file they become
+IMPORT_SUFFIXES = {".in" : TestFile.INPUT, ".out" : TestFile.OUTPUT, ".ans" : TestFile.OUTPUT,
+                   ".data" : TestFile.DATA}
+
+def _naturalSortKey(name):
+    """ Sort key that orders the numbers in name by value, so 2 comes before 10. """
+    return [(0, int(part), "") if part.isdigit() else (1, 0, part) for part in re.split(r"(\d+)", name)]
+
+def findTestFiles(directory):
+    """ Find the test files in directory. Files are grouped into tests by their name without
+    extension, and the extension decides the test file (see IMPORT_SUFFIXES). Tests without
+    an input file are ignored.
+
+    Return a list of (name, {TestFile: path}) pairs, ordered naturally by name. """
+    found = {}
+    with os.scandir(directory) as scan:
+        for entry in scan:
+            name, suffix = os.path.splitext(entry.name)
+            if suffix in IMPORT_SUFFIXES and entry.is_file():
+                found.setdefault(name, {})[IMPORT_SUFFIXES[suffix]] = entry.path
+    return sorted(((name, files) for name, files in found.items() if TestFile.INPUT in files),
+                  key = lambda pair: _naturalSortKey(pair[0]))
@@ -0,0 +1,93 @@
+""" Module for timing solutions precisely, by running them several times.
+
+A single run is affected by cold caches and by whatever else the machine is doing, so timings are
+taken over several runs, after a few warmup runs whose times are thrown away. Two solutions can
+be compared with the Mann-Whitney U test, which tells whether one is consistently slower than
+the other without assuming anything about how the times are distributed. """
+
+import math, statistics
+
+from compprogutils import streams, tests
+
+class TimingSamples:
+    """ The wall times and CPU times, in seconds, of repeated runs of a solution on a test. """
+    def __init__(self, wallTimes = None, cpuTimes = None):
+        self.wallTimes = wallTimes if wallTimes is not None else []
+        self.cpuTimes = cpuTimes if cpuTimes is not None else []
+
+    def add(self, runResult):
+        """ Add the times of the RunResult runResult. """
+        self.wallTimes.append(runResult.timeElapsed)
+        self.cpuTimes.append(runResult.cpuTime)
+
+    def summary(self):
+        """ Return a dict with the min, median and 95th percentile of the wall and CPU times. """
+        return {"wall" : summarize(self.wallTimes), "cpu" : summarize(self.cpuTimes)}
+
+def percentile(samples, fraction):
+    """ Return the given fraction (between 0 and 1) percentile of samples, interpolating
+    linearly between the closest samples. """
+    ordered = sorted(samples)
+    position = fraction * (len(ordered) - 1)
+    lower = math.floor(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+def summarize(samples):
+    """ Return a dict with the min, median and 95th percentile (p95) of samples. """
+    return {"min" : min(samples), "median" : statistics.median(samples), "p95" : percentile(samples, 0.95)}
+
+def timeRun(solExec, testPackage, **runOptions):
+    """ Run solExec once on testPackage, discarding its output, and return the RunResult.
+    runOptions are passed to solExec.run. """
+    with testPackage.getFileObject(tests.TestFile.INPUT, "rb") as testInput:
+        return solExec.run(fileInput = testInput, outputSink = streams.NullSink(), **runOptions)
+
+def measure(solExec, testPackage, repeat, warmup = 0, **runOptions):
+    """ Run solExec on testPackage warmup times, then repeat times, and return the TimingSamples
+    of the last repeat runs. runOptions are passed to solExec.run. """
+    for _ in range(warmup):
+        timeRun(solExec, testPackage, **runOptions)
+    samples = TimingSamples()
+    for _ in range(repeat):
+        samples.add(timeRun(solExec, testPackage, **runOptions))
+    return samples
+
+def measurePair(firstExec, secondExec, testPackage, repeat, warmup = 0, **runOptions):
+    """ Like measure, but for two solutions. Their runs alternate, so that changes in the load of the
+    machine affect both alike. Return the TimingSamples of firstExec and of secondExec. """
+    for _ in range(warmup):
+        timeRun(firstExec, testPackage, **runOptions)
+        timeRun(secondExec, testPackage, **runOptions)
+    firstSamples, secondSamples = TimingSamples(), TimingSamples()
+    for _ in range(repeat):
+        firstSamples.add(timeRun(firstExec, testPackage, **runOptions))
+        secondSamples.add(timeRun(secondExec, testPackage, **runOptions))
+    return firstSamples, secondSamples
+
+def mannWhitneyU(first, second):
+    """ Return the two-sided p-value of the Mann-Whitney U test on the lists of samples first and second:
+    the probability that samples at least this different would come from the same distribution.
+    The normal approximation is used, with a correction for ties. """
+    n1, n2 = len(first), len(second)
+    combined = sorted([(value, 0) for value in first] + [(value, 1) for value in second])
+    # Give tied values the average of the ranks they span
+    rankSumFirst = 0
+    tieCorrection = 0
+    start = 0
+    while start < len(combined):
+        end = start
+        while end < len(combined) and combined[end][0] == combined[start][0]:
+            end += 1
+        averageRank = (start + 1 + end) / 2
+        rankSumFirst += averageRank * sum(1 for _, group in combined[start:end] if group == 0)
+        tieCorrection += (end - start) ** 3 - (end - start)
+        start = end
+    u = rankSumFirst - n1 * (n1 + 1) / 2
+    n = n1 + n2
+    variance = n1 * n2 / 12 * ((n + 1) - tieCorrection / (n * (n - 1)))
+    if variance <= 0:
+        return 1.0
+    # The 0.5 is a continuity correction
+    z = (abs(u - n1 * n2 / 2) - 0.5) / math.sqrt(variance)
+    return min(1.0, math.erfc(max(z, 0) / math.sqrt(2)))
@@ -0,0 +1,76 @@
+""" Module for recording where cpu spends its time.
+
+While tracing is on, timed spans (reading manifests, compiling, running programs, checking outputs, ...)
+are appended to a trace file in the Chrome trace event format, one event per line. The file starts
+with a line holding "[", and every event line ends with a comma; trace viewers (chrome://tracing,
+Perfetto) accept this without the closing bracket. Several processes may append to the same file,
+so traces of worker processes and of several commands can be collected together.
+
+Tracing is turned on with cpu's --trace option, or by setting the CPU_TRACE environment variable
+to the name of the trace file. """
+
+import functools, json, os, threading, time
+from contextlib import contextmanager
+
+TRACE_VARIABLE = "CPU_TRACE"
+
+# The trace file, and the process that opened it; worker processes reopen it
+_traceState = {"path" : None, "fd" : None, "pid" : None}
+
+def start(fileName):
+    """ Start appending spans to the trace file with the given name. """
+    stop()
+    _traceState["path"] = os.path.abspath(fileName)
+
+def stop():
+    """ Stop tracing, and close the trace file. """
+    if _traceState["fd"] is not None and _traceState["pid"] == os.getpid():
+        os.close(_traceState["fd"])
+    _traceState.update(path = None, fd = None, pid = None)
+
+def enabled():
+    """ Return True iff spans are being recorded. """
+    return _traceState["path"] is not None
+
+def _writeEvent(event):
+    """ Append the trace event event, a dict, to the trace file. """
+    if _traceState["pid"] != os.getpid():
+        fd = os.open(_traceState["path"], os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o666)
+        if os.fstat(fd).st_size == 0:
+            os.write(fd, b"[\n")
+        _traceState.update(fd = fd, pid = os.getpid())
+    # A single write, so that lines from different processes are never interleaved
+    os.write(_traceState["fd"], (json.dumps(event) + ",\n").encode("utf-8"))
+
+@contextmanager
+def span(name, **args):
+    """ Context manager that records the time spent inside it as a span with the given name.
+    args are stored with the span, and shown by trace viewers. The span dict is yielded, or
+    None if tracing is off, so more args can be added to span["args"] while it runs. """
+    if not enabled():
+        yield None
+        return
+    event = {"name" : name, "cat" : "cpu", "ph" : "X", "pid" : os.getpid(), "tid" : threading.get_ident(),
+             "args" : args}
+    started = time.perf_counter_ns()
+    event["ts"] = time.time_ns() // 1000
+    try:
+        yield event
+    finally:
+        event["dur"] = (time.perf_counter_ns() - started) / 1000
+        if enabled():
+            _writeEvent(event)
+
+def traced(name, spanArgs = None):
+    """ Decorator that records every call of the decorated function as a span with the given name.
+    If spanArgs is given, it is called with the arguments of each call, and returns a dict of
+    args to store with the span. """
+    def decorator(func):
+        @functools.wraps(func)
+        def tracedFunc(*args, **kwargs):
+            if not enabled():
+                return func(*args, **kwargs)
+            with span(name, **(spanArgs(*args, **kwargs) if spanArgs is not None else {})):
+                return func(*args, **kwargs)
+        return tracedFunc
+    return decorator
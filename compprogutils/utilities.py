@@ -1,10 +1,29 @@
-import os, errno, itertools
+import os, errno, itertools, shutil, sys, types
 from contextlib import contextmanager
+# For lazy imports
+import importlib
 
 from compprogutils import cpu_errors
 
 import functools
 
+class _LazyModule(types.ModuleType):
+    """ Stand-in for a module that is imported the first time one of its attributes is used.
+    The import goes through importlib.import_module, which is safe to do from several threads:
+    a thread that asks for a module another thread is importing waits until it is done. """
+    def __getattr__(self, name):
+        module = self.__dict__.get("_module")
+        if module is None:
+            module = self.__dict__["_module"] = importlib.import_module(self.__name__)
+        return getattr(module, name)
+
+def lazyImport(moduleName):
+    """ Return the module with the given name, without running it until one of its attributes is used.
+    Use this for modules that are slow to import and only needed by some commands. """
+    if moduleName in sys.modules:
+        return sys.modules[moduleName]
+    return _LazyModule(moduleName)
+
 @contextmanager
 def cd(newDir):
     """ Context manager for performing operations in another directory."""
@@ -26,6 +45,17 @@ def requirePresentKey(dct, keyName, keyType):
     if keyName not in dct:
         raise cpu_errors.UnknownProgram(f""" cpu does not know the {keyType} name {keyName}. """)
 
+def copyOrLink(src, dst, link = False):
+    """ Copy the file src to dst. If link is true, make dst a hard link to src instead, falling
+    back to copying if that is not possible (e.g. src is on another filesystem). """
+    if link:
+        try:
+            os.link(src, dst)
+            return
+        except OSError:
+            pass
+    shutil.copyfile(src, dst)
+
 def humanizeFileSize(num, suffix='B'):
     # Ripped from https://gist.github.com/cbwar/d2dfbc19b140bd599daccbe0fe925597, 
     # figured this was too trivial to get a dependency for
@@ -54,13 +84,16 @@ def wrapString(s, maxWidth, maxLines, indent = ">", placeholder="[...]"):
     on the last line.
     """
     wrapped = []
-    widthNext = maxWidth - len(indent)
+    widthNext = max(1, maxWidth - len(indent))
     for longLine in s.split('\n'):
         toPlaceHere, nextSection = longLine[:maxWidth], longLine[maxWidth:]
         wrapped.append(toPlaceHere)
-        while nextSection:
-            toPlaceHere, nextSecton = longLine[:maxWidth], longLine[maxWidth:]
+        # Lines past maxLines are cut anyway, so stop wrapping once there are more
+        while nextSection and len(wrapped) <= maxLines:
+            toPlaceHere, nextSection = nextSection[:widthNext], nextSection[widthNext:]
             wrapped.append(indent + toPlaceHere)
+        if len(wrapped) > maxLines:
+            break
     if len(wrapped) > maxLines:
         wrapped = wrapped[:maxLines - 1] + [placeholder]
     return '\n'.join(wrapped)
@@ -69,11 +102,12 @@ def wrapStringList(*args, **kwargs):
     """ Returns wrapString's individual lines as a list. """
     return wrapString(*args, **kwargs).split("\n")
 
-def getFileContents(fileName, default = "[None]", maxLines = None):
-    """ Get the first maxLines file of fileName. Return default if the file does not exist. """
+def getFileContents(fileName, default = "[None]", maxLines = None, opener = open):
+    """ Get the first maxLines file of fileName. Return default if the file does not exist.
+    The file is opened with opener, which is called like open. """
     fileContents = default
     try:
-        with open(fileName, "r")  as fl:
+        with opener(fileName, "r")  as fl:
             if maxLines is not None:
                 fileContents = ''.join(itertools.islice(fl, maxLines))
             else:
@@ -82,10 +116,30 @@ def getFileContents(fileName, default = "[None]", maxLines = None):
         pass
     return fileContents
 
-def wrapFileContentsList(fileName, maxWidth, maxLines, indent = ">", placeholder = "[...]"):
-    """ Get the first maxLines lines of fileName, using the parameters given to wrapStringList. """
-    return wrapStringList(getFileContents(fileName, maxLines = maxLines),
-                        maxWidth, maxLines, indent, placeholder)
+def wrapFileContentsList(fileName, maxWidth, maxLines, indent = ">", placeholder = "[...]", opener = open):
+    """ Get the first maxLines lines of fileName, using the parameters given to wrapStringList.
+    Only the start of the file is read, so this takes the same time for files of any size. Previews
+    are cached until the file changes; the returned list must not be modified. """
+    try:
+        fileStat = os.stat(fileName)
+    except FileNotFoundError:
+        return wrapStringList("[None]", maxWidth, maxLines, indent, placeholder)
+    return _cachedPreview(fileName, (fileStat.st_mtime_ns, fileStat.st_size, fileStat.st_ino),
+                          maxWidth, maxLines, indent, placeholder, opener)
+
+@functools.lru_cache(maxsize = 1024)
+def _cachedPreview(fileName, stamp, maxWidth, maxLines, indent, placeholder, opener):
+    """ Return wrapFileContentsList's preview of fileName. stamp identifies the version of the file,
+    so changing the file makes a new cache entry. """
+    # Every wrapped line holds at least one character of the file, so this many characters are
+    # enough to fill maxLines lines, with one left over to tell that the preview is cut
+    charsNeeded = maxLines * (maxWidth + 1) + 1
+    try:
+        with opener(fileName, "r", errors = "replace") as fl:
+            contents = fl.read(charsNeeded)
+    except FileNotFoundError:
+        contents = "[None]"
+    return wrapStringList(contents, maxWidth, maxLines, indent, placeholder)
 
 def confirmPrompt(prompt):
     """ Displays a y/n confirmation prompt to the user. Returns True iff
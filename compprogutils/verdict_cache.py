@@ -0,0 +1,106 @@
+""" Module for caching the verdicts of tests, so that tests are only judged again when something
+they depend on changes.
+
+The cache is stored in the problem folder. Each verdict is stored under the solution and test it
+belongs to, along with a key: a hash of the solution and checker programs, the test's files, and the
+options the test was run with. A cached verdict is only used if its key is still the same. The hashes
+of files are cached as well, and only computed again when a file's stamp changes. """
+
+import hashlib, json, os, tempfile
+
+from compprogutils import compile_cache, tests
+
+CACHE_FILE_NAME = ".cpu.verdict_cache.json"
+
+def _fileStamp(fileName):
+    """ Return a value that changes whenever the file with the given name is modified. """
+    fileStat = os.stat(fileName)
+    return [fileStat.st_mtime_ns, fileStat.st_size, fileStat.st_ino]
+
+class VerdictCache:
+    """ The verdict cache of the problem in the current folder. Use load() to read it, and save()
+    to write back the changes. """
+    def __init__(self, verdicts = None, fileHashes = None):
+        # verdicts[solution][test] is a dict with the key and the serialized verdict
+        self.verdicts = verdicts if verdicts is not None else {}
+        # fileHashes[file] is a [stamp, hash] pair
+        self.fileHashes = fileHashes if fileHashes is not None else {}
+
+    @classmethod
+    def load(cls):
+        """ Read the cache from the current folder. Return an empty cache if there is none,
+        or if it cannot be read. """
+        try:
+            with open(CACHE_FILE_NAME) as cacheFile:
+                cached = json.load(cacheFile)
+            return cls(cached["verdicts"], cached["file_hashes"])
+        except (FileNotFoundError, ValueError, KeyError):
+            return cls()
+
+    def save(self):
+        """ Write the cache to the current folder, forgetting the hashes of files that no longer exist. """
+        self.fileHashes = {fileName: entry for fileName, entry in self.fileHashes.items() if os.path.isfile(fileName)}
+        fd, tempName = tempfile.mkstemp(dir = ".", prefix = ".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump({"verdicts" : self.verdicts, "file_hashes" : self.fileHashes}, f)
+            os.replace(tempName, CACHE_FILE_NAME)
+        except BaseException:
+            os.remove(tempName)
+            raise
+
+    def fileHash(self, fileName):
+        """ Return the SHA-256 hash of the file with the given name, or None if it does not exist. """
+        try:
+            stamp = _fileStamp(fileName)
+        except FileNotFoundError:
+            return None
+        entry = self.fileHashes.get(fileName)
+        if entry is not None and entry[0] == stamp:
+            return entry[1]
+        hasher = hashlib.sha256()
+        with open(fileName, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 16), b""):
+                hasher.update(chunk)
+        self.fileHashes[fileName] = [stamp, hasher.hexdigest()]
+        return hasher.hexdigest()
+
+    def programIdentity(self, executable):
+        """ Return a string identifying the behavior of executable: its serialized form, the hash of its
+        compiled program, and the program its run command starts. """
+        identity = [executable.__serialize__()]
+        if not executable.precompiled:
+            runCommand = executable.getRunCommand()
+            execHash = None if executable.exec_loc is None else self.fileHash(executable.exec_loc)
+            identity += [execHash, runCommand, compile_cache.compilerIdentity(runCommand)]
+        return json.dumps(identity)
+
+    def verdictKey(self, solExec, checkerExec, testPackage, runOptions):
+        """ Return the key of judging testPackage with solExec and checkerExec, with the
+        given runOptions (see judging.judgeTest). """
+        hasher = hashlib.sha256()
+        for part in [self.programIdentity(solExec), self.programIdentity(checkerExec),
+                     json.dumps(sorted(runOptions.items()))]:
+            hasher.update(part.encode("utf-8"))
+        for testFile in tests.TestFile:
+            hasher.update(str(self.fileHash(testPackage.getStoredFilename(testFile))).encode("utf-8"))
+        return hasher.hexdigest()
+
+    def getVerdict(self, solName, testName, key):
+        """ Return the serialized verdict of testName for solName, or None if it is not cached under key. """
+        entry = self.verdicts.get(solName, {}).get(testName)
+        if entry is None or entry["key"] != key:
+            return None
+        return entry["verdict"]
+
+    def putVerdict(self, solName, testName, key, verdict):
+        """ Cache the serialized verdict of testName for solName under key. """
+        self.verdicts.setdefault(solName, {})[testName] = {"key" : key, "verdict" : verdict}
+
+    def forgetTestsExcept(self, testNames):
+        """ Forget the verdicts of tests whose names are not in testNames. """
+        testNames = set(testNames)
+        for solVerdicts in self.verdicts.values():
+            for testName in list(solVerdicts):
+                if testName not in testNames:
+                    del solVerdicts[testName]
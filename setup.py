@@ -13,6 +13,9 @@ setup(
     install_requires = [
         "terminaltables"
     ],
+    extras_require = {
+        "zstd" : ["zstandard"]
+    },
     entry_points = {
         "console_scripts" : [
             "cpu = compprogutils.cpu:main"